@@ -19,6 +19,7 @@ import argparse
 import json
 from typing import List, Dict, Tuple, Optional
 from datetime import datetime
+import numpy as np
 
 # Add parent directory to path for imports
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -27,6 +28,68 @@ from utility.get_analysis import get_user_analysis
 from filtering_products.allergen.allergen_filtering import AllergenFilter
 from mapping import SPECIAL_MAPPINGS, BeautyPreferencesSkinConcern
 from db.connection import get_database_manager
+from db.utils import to_vector_array, format_vector_literal
+
+CONCEPT_EMBEDDINGS_QUERY = """
+SELECT name, embedding 
+FROM concepts 
+WHERE embedding IS NOT NULL
+ORDER BY name
+"""
+
+# Known mappings based on actual database concepts (normalized concern -> normalized concept)
+CONCEPT_ALIASES = {
+    'darkcircles': 'darkcircles',
+    'puffiness': 'eyebag',  # puffiness maps to Eyebag concept
+    'finelines': 'wrinkles',
+    'finelineswrinkles': 'wrinkles',
+    'acneblemishes': 'acne',  # This exists as 'Acne' in database
+    'blemishes': 'acne'
+}
+
+
+def _normalize_concept_name(name: str) -> str:
+    """Lowercase a concern/concept name and drop spaces, hyphens and underscores."""
+    return name.lower().replace(' ', '').replace('-', '').replace('_', '')
+
+
+# Parsed concept embeddings shared by every analysis in this process
+_concept_embeddings: Tuple[Tuple[str, str, Optional[np.ndarray]], ...] = ()
+
+
+def _load_concept_embeddings() -> Tuple[Tuple[str, str, Optional[np.ndarray]], ...]:
+    """
+    Fetch and parse all concept embeddings (loaded once per process).
+    
+    Concepts only change when populate_database.py/update_embeddings.py run,
+    so every analysis reuses the same parsed vectors instead of transferring
+    and parsing all of them again. Only a non-empty result is kept, so a
+    process started before concepts are populated picks them up later. Set
+    _concept_embeddings to () after repopulating concepts in a long-running
+    process.
+    
+    Returns:
+        Tuple of (concept_name, normalized_name, embedding) in name order;
+        embedding is None if the stored value is not a vector
+    """
+    global _concept_embeddings
+    if _concept_embeddings:
+        return _concept_embeddings
+    
+    with get_database_manager().get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(CONCEPT_EMBEDDINGS_QUERY)
+            rows = cursor.fetchall()
+    
+    concepts = []
+    for concept_name, embedding in rows:
+        vector = to_vector_array(embedding)
+        if vector is not None:
+            vector.setflags(write=False)  # shared by every caller
+        concepts.append((concept_name, _normalize_concept_name(concept_name), vector))
+    
+    _concept_embeddings = tuple(concepts)
+    return _concept_embeddings
 
 
 class ProductAnalysisModule:
@@ -186,67 +249,50 @@ class ProductAnalysisModule:
         
         return concern_scores
     
-    def _get_concern_embeddings(self, concern_names: List[str]) -> Dict[str, List[float]]:
+    def _get_concern_embeddings(self, concern_names: List[str]) -> Dict[str, np.ndarray]:
         """Get embeddings for concerns from the concepts table with robust matching"""
         print(f"  🧠 Retrieving embeddings for {len(concern_names)} concerns...")
         
         concern_embeddings = {}
         
         try:
-            with get_database_manager().get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    # Get all available concepts first for better matching
-                    cursor.execute("""
-                    SELECT name, embedding 
-                    FROM concepts 
-                    WHERE embedding IS NOT NULL
-                    ORDER BY name
-                    """)
+            # Get all available concepts first for better matching
+            available_concepts = _load_concept_embeddings()
+            print(f"    📋 Available concepts: {[name for name, _, _ in available_concepts]}")
+            
+            for concern in concern_names:
+                matched_concept = None
+                
+                # Try multiple matching strategies
+                normalized_concern = _normalize_concept_name(concern)
+                
+                for concept_name, normalized_concept, embedding in available_concepts:
+                    # Strategy 1: Exact match after normalization
+                    if normalized_concern == normalized_concept:
+                        matched_concept = (concept_name, embedding)
+                        break
                     
-                    available_concepts = cursor.fetchall()
-                    print(f"    📋 Available concepts: {[name for name, _ in available_concepts]}")
+                    # Strategy 2: Concern contains concept or vice versa
+                    elif (normalized_concern in normalized_concept or 
+                          normalized_concept in normalized_concern):
+                        matched_concept = (concept_name, embedding)
+                        break
                     
-                    for concern in concern_names:
-                        matched_concept = None
-                        
-                        # Try multiple matching strategies
-                        normalized_concern = concern.lower().replace(' ', '').replace('-', '').replace('_', '')
-                        
-                        for concept_name, embedding in available_concepts:
-                            normalized_concept = concept_name.lower().replace(' ', '').replace('-', '').replace('_', '')
-                            
-                            # Strategy 1: Exact match after normalization
-                            if normalized_concern == normalized_concept:
-                                matched_concept = (concept_name, embedding)
-                                break
-                            
-                            # Strategy 2: Concern contains concept or vice versa
-                            elif (normalized_concern in normalized_concept or 
-                                  normalized_concept in normalized_concern):
-                                matched_concept = (concept_name, embedding)
-                                break
-                            
-                            # Strategy 3: Special known mappings based on actual database content
-                            elif self._is_concept_match(normalized_concern, normalized_concept):
-                                matched_concept = (concept_name, embedding)
-                                break
-                        
-                        if matched_concept:
-                            concept_name, embedding = matched_concept
-                            
-                            # Convert PostgreSQL vector to Python list
-                            if embedding:
-                                embedding_str = str(embedding)
-                                if embedding_str.startswith('[') and embedding_str.endswith(']'):
-                                    embedding_list = [float(x.strip()) for x in embedding_str[1:-1].split(',')]
-                                    concern_embeddings[concern] = embedding_list
-                                    print(f"    ✅ {concern} → {concept_name} (embedding: {len(embedding_list)}D)")
-                                else:
-                                    print(f"    ⚠️  {concern} → {concept_name} (invalid embedding format)")
-                            else:
-                                print(f"    ⚠️  {concern} → {concept_name} (no embedding)")
-                        else:
-                            print(f"    ❌ {concern} → No matching concept found")
+                    # Strategy 3: Special known mappings based on actual database content
+                    elif self._is_concept_match(normalized_concern, normalized_concept):
+                        matched_concept = (concept_name, embedding)
+                        break
+                
+                if matched_concept:
+                    concept_name, embedding = matched_concept
+                    
+                    if embedding is not None:
+                        concern_embeddings[concern] = embedding
+                        print(f"    ✅ {concern} → {concept_name} (embedding: {len(embedding)}D)")
+                    else:
+                        print(f"    ⚠️  {concern} → {concept_name} (invalid embedding format)")
+                else:
+                    print(f"    ❌ {concern} → No matching concept found")
         
         except Exception as e:
             print(f"  ❌ Database error: {e}")
@@ -256,17 +302,7 @@ class ProductAnalysisModule:
     
     def _is_concept_match(self, concern: str, concept: str) -> bool:
         """Check if concern matches concept using known mappings"""
-        # Known mappings based on actual database concepts
-        mappings = {
-            'darkcircles': 'darkcircles',
-            'puffiness': 'eyebag',  # puffiness maps to Eyebag concept
-            'finelines': 'wrinkles',
-            'finelineswrinkles': 'wrinkles',
-            'acneblemishes': 'acne',  # This exists as 'Acne' in database
-            'blemishes': 'acne'
-        }
-        
-        return mappings.get(concern) == concept
+        return CONCEPT_ALIASES.get(concern) == concept
     
     def _get_allergen_filter(self, user_id: int) -> Tuple[str, List[str]]:
         """Get allergen filter SQL components"""
@@ -292,7 +328,7 @@ class ProductAnalysisModule:
     
     def _calculate_product_scores(
         self,
-        concern_embeddings: Dict[str, List[float]],
+        concern_embeddings: Dict[str, np.ndarray],
         concern_scores: Dict[str, float],
         allergen_where: str,
         allergen_params: List[str],
@@ -318,8 +354,8 @@ class ProductAnalysisModule:
         for concern_name, embedding in concern_embeddings.items():
             weight = concern_scores.get(concern_name, 0)
             # Convert distance to similarity: 1 - distance
-            concern_score_clauses.append(f"({weight} * (1 - (p.embedding <=> %s::vector)))")
-            concern_params.append(str(embedding))
+            concern_score_clauses.append(f"({weight} * (1 - (p.embedding <=> %s::halfvec)))")
+            concern_params.append(format_vector_literal(embedding))
 
         # Build concern formula once
         concern_scoring_formula = " + ".join(concern_score_clauses) if concern_score_clauses else "0"
@@ -355,7 +391,7 @@ class ProductAnalysisModule:
         final_score_clauses = []
         for concern_name, embedding in concern_embeddings.items():
             weight = concern_scores.get(concern_name, 0)
-            final_score_clauses.append(f"({weight} * (1 - (p.embedding <=> %s::vector)))")
+            final_score_clauses.append(f"({weight} * (1 - (p.embedding <=> %s::halfvec)))")
         
         final_score_concern_formula = " + ".join(final_score_clauses) if final_score_clauses else "0"
         
@@ -490,7 +526,7 @@ class ProductAnalysisModule:
     
     def _calculate_concern_only_scores(
         self,
-        concern_embeddings: Dict[str, List[float]],
+        concern_embeddings: Dict[str, np.ndarray],
         concern_scores: Dict[str, float],
         allergen_where: str,
         allergen_params: List[str],
@@ -506,8 +542,8 @@ class ProductAnalysisModule:
 
         for concern_name, embedding in concern_embeddings.items():
             weight = concern_scores.get(concern_name, 0)
-            score_clauses.append(f"({weight} * (1 - (embedding <=> %s::vector)))")
-            query_params.append(str(embedding))
+            score_clauses.append(f"({weight} * (1 - (embedding <=> %s::halfvec)))")
+            query_params.append(format_vector_literal(embedding))
 
         scoring_formula = " + ".join(score_clauses)
 
@@ -47,6 +47,7 @@ from utility.get_preference import get_preference
 
 from analysis_recommendation.analysis import ProductAnalysisModule, display_results
 from db.connection import get_database_manager
+from db.utils import format_vector_literal, to_vector_array
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -55,13 +56,14 @@ from db.connection import get_database_manager
 _VECTOR_DIM = 384  # must match pgvector dimension
 
 
-def _pgvector_to_np(raw: str) -> np.ndarray:
-    """Convert pgvector string '[0.1,0.2,...]' to numpy 1-D float array."""
+def _pgvector_to_np(raw) -> np.ndarray:
+    """Convert a pgvector value (decoded array/HalfVector or '[0.1,0.2,...]') to numpy 1-D float array."""
     if raw is None:
         raise ValueError("Null embedding")
-    if raw.startswith("[") and raw.endswith("]"):
-        return np.fromstring(raw[1:-1], sep=",", dtype=float)
-    raise ValueError("Unexpected vector format")
+    vec = to_vector_array(raw)
+    if vec is None:
+        raise ValueError("Unexpected vector format")
+    return vec
 
 
 def _cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
@@ -156,7 +158,7 @@ def _map_pref_concerns(prefs: Dict) -> Dict[str, float]:
 
 def _fetch_candidate_products(
     *,
-    concern_embeddings: Dict[str, List[float]],
+    concern_embeddings: Dict[str, np.ndarray],
     concern_scores: Dict[str, float],
     allergen_where: str,
     allergen_params: List[str],
@@ -172,8 +174,8 @@ def _fetch_candidate_products(
     params: List = []
     for cname, emb in concern_embeddings.items():
         weight = concern_scores.get(cname.lower(), 1.0)
-        concern_clauses.append("(%s * (1 - (p.embedding <=> %s::vector)))")
-        params.extend([weight, str(emb)])
+        concern_clauses.append("(%s * (1 - (p.embedding <=> %s::halfvec)))")
+        params.extend([weight, format_vector_literal(emb)])
     concern_formula = " + ".join(concern_clauses)
     where = ["p.embedding IS NOT NULL"]
     if not include_out_of_stock:
@@ -8,13 +8,20 @@ and includes connection pooling, error handling, and database utilities.
 
 import os
 import sys
+import time
+import weakref
 from typing import Dict, Any, Optional, Tuple
 from contextlib import contextmanager
 import psycopg2
-from psycopg2 import Error, pool
+from psycopg2 import Error, pool, sql
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 
+try:
+    from pgvector.psycopg2 import register_vector
+except ImportError:
+    register_vector = None
+
 # Load environment variables
 load_dotenv()
 
@@ -40,7 +47,10 @@ class DatabaseConfig:
             'port': self.port,
             'database': self.database,
             'user': self.user,
-            'password': self.password
+            'password': self.password,
+            # TCP keepalives so idle pooled connections are not silently dropped
+            'keepalives': '1',
+            'keepalives_idle': '30'
         }
     
     def get_connection_string(self) -> str:
@@ -51,18 +61,22 @@ class DatabaseConfig:
 class DatabaseManager:
     """Database connection manager with connection pooling."""
     
-    def __init__(self, min_conn: int = 1, max_conn: int = 10):
+    def __init__(self, min_conn: int = 2, max_conn: Optional[int] = None):
         """
         Initialize database manager with connection pooling.
         
         Args:
             min_conn: Minimum number of connections in pool
-            max_conn: Maximum number of connections in pool
+            max_conn: Maximum number of connections in pool (default: twice the CPU count)
         """
+        if max_conn is None:
+            max_conn = max(min_conn, (os.cpu_count() or 4) * 2)
         self.config = DatabaseConfig()
         self.connection_pool = None
         self.min_conn = min_conn
         self.max_conn = max_conn
+        # Pooled connections the pgvector adapters have been registered on
+        self._vector_connections = weakref.WeakSet()
         self._initialize_pool()
     
     def _initialize_pool(self):
@@ -94,11 +108,34 @@ class DatabaseManager:
                 # Connection is closed, get a new one
                 self.connection_pool.putconn(conn, close=True)
                 conn = self.connection_pool.getconn()
+            self._register_vector(conn)
             return conn
         except Exception as e:
             print(f"❌ Failed to get connection from pool: {e}")
             raise
     
+    def _register_vector(self, conn: psycopg2.extensions.connection):
+        """
+        Register the pgvector adapters on a pooled connection, once per connection.
+        
+        Registration sticks to the connection across borrowers, so it is done
+        for every pooled connection: vector columns always decode to numpy
+        arrays / HalfVector objects and numpy arrays bind as vector parameters,
+        whichever code borrowed the connection first.
+        
+        Args:
+            conn: Connection just taken from the pool
+        """
+        if register_vector is None or conn in self._vector_connections:
+            return
+        self._vector_connections.add(conn)
+        try:
+            register_vector(conn, globally=False)
+        except Exception as e:
+            print(f"⚠️ pgvector adapters not registered (is the vector extension installed?): {e}")
+        # Don't hand out a connection with the type lookup's transaction open
+        conn.rollback()
+    
     def return_connection(self, conn: psycopg2.extensions.connection, close: bool = False):
         """
         Return a connection to the pool.
@@ -188,15 +225,18 @@ def test_db_connection() -> bool:
     try:
         with get_database_manager().get_db_connection() as conn:
             with conn.cursor() as cursor:
-                # Test basic query
-                cursor.execute("SELECT version()")
-                version = cursor.fetchone()[0]
-                print(f"✅ Database connection test successful")
+                # Server version and pgvector availability in a single round-trip
+                start_ns = time.perf_counter_ns()
+                cursor.execute("""
+                    SELECT version(),
+                           EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'vector')
+                """)
+                version, has_vector = cursor.fetchone()
+                round_trip_ms = (time.perf_counter_ns() - start_ns) / 1e6
+                print(f"✅ Database connection test successful ({round_trip_ms:.2f} ms round-trip)")
                 print(f"PostgreSQL version: {version}")
                 
-                # Test pgvector extension
-                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'vector'")
-                if cursor.fetchone():
+                if has_vector:
                     print("✅ pgvector extension is available")
                 else:
                     print("⚠️ pgvector extension is not installed")
@@ -281,7 +321,7 @@ def get_table_info(table_name: str) -> Dict[str, Any]:
                 columns = cursor.fetchall()
                 
                 # Get row count
-                cursor.execute(f"SELECT COUNT(*) as count FROM {table_name}")
+                cursor.execute(sql.SQL("SELECT COUNT(*) as count FROM {}").format(sql.Identifier(table_name)))
                 row_count = cursor.fetchone()['count']
                 
                 return {
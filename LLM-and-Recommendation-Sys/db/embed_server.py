@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""
+Keep the embedding model loaded in a long-running process.
+
+Loading the sentence-transformer takes several seconds on every run of
+update_embeddings.py. This server loads it once and answers embedding
+requests over a UNIX socket, so frequent delta runs only pay for the
+forward passes.
+
+Protocol (one request per connection):
+    request:  4-byte little-endian length + UTF-8 JSON list of texts
+    response: two 4-byte little-endian ints (rows, dim) + rows*dim float16 values
+
+Usage:
+python embed_server.py [--socket /tmp/recom_embed.sock] [--onnx]
+
+Then run update_embeddings.py with --embed_socket pointing at the same path.
+"""
+import os
+import sys
+import argparse
+import json
+import socket
+import socketserver
+import struct
+import numpy as np
+
+# Add the parent directory to sys.path to import local modules
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, parent_dir)
+
+DEFAULT_SOCKET_PATH = "/tmp/recom_embed.sock"
+
+LENGTH_HEADER = struct.Struct("<I")
+SHAPE_HEADER = struct.Struct("<II")
+
+def recv_exact(sock, size):
+    """
+    Read exactly size bytes from a socket.
+
+    Args:
+        sock: Connected socket
+        size: Number of bytes to read
+
+    Returns:
+        The bytes read
+    """
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            raise ConnectionError("Socket closed before the full message arrived")
+        received += count
+    return bytes(buffer)
+
+class EmbeddingServerClient:
+    """
+    Drop-in replacement for the embedding model that forwards to embed_server.py.
+
+    Embeddings travel as float16 and are returned as float32 numpy arrays,
+    matching what CachedEmbeddings and the write path expect.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH):
+        """
+        Args:
+            socket_path: Path of the server's UNIX socket
+        """
+        self.socket_path = socket_path
+
+    def is_available(self):
+        """Return True if a server is listening on the socket."""
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(self.socket_path)
+            return True
+        except OSError:
+            return False
+
+    def embed_documents(self, texts):
+        """
+        Embed texts on the server.
+
+        Args:
+            texts: List of texts to embed
+
+        Returns:
+            List of float32 numpy embeddings in input order
+        """
+        payload = json.dumps(list(texts)).encode("utf-8")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(self.socket_path)
+            sock.sendall(LENGTH_HEADER.pack(len(payload)) + payload)
+            rows, dim = SHAPE_HEADER.unpack(recv_exact(sock, SHAPE_HEADER.size))
+            data = recv_exact(sock, rows * dim * 2)
+        embeddings = np.frombuffer(data, dtype=np.float16).reshape(rows, dim).astype(np.float32)
+        return list(embeddings)
+
+class EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """Answer one embedding request with the server's model."""
+
+    def handle(self):
+        try:
+            (length,) = LENGTH_HEADER.unpack(recv_exact(self.request, LENGTH_HEADER.size))
+        except ConnectionError:
+            # Availability probe from EmbeddingServerClient.is_available()
+            return
+        texts = json.loads(recv_exact(self.request, length).decode("utf-8"))
+
+        if texts:
+            embeddings = np.asarray(self.server.embedding_model.embed_documents(texts), dtype=np.float16)
+        else:
+            embeddings = np.empty((0, 0), dtype=np.float16)
+
+        rows, dim = embeddings.shape
+        self.request.sendall(SHAPE_HEADER.pack(rows, dim) + embeddings.tobytes())
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Serve embeddings from a model kept in memory.")
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET_PATH, help="UNIX socket path to listen on")
+    parser.add_argument("--onnx", action="store_true",
+                        help="On CPU, embed with the int8-quantized ONNX model (requires optimum[onnxruntime])")
+    return parser.parse_args()
+
+def main():
+    """Load the model once and serve requests until interrupted."""
+    args = parse_args()
+
+    from db.update_embeddings import create_embeddings_model
+
+    embedding_model = create_embeddings_model(args.onnx)
+
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+
+    # Requests are handled one at a time; the model already parallelizes each batch
+    with socketserver.UnixStreamServer(args.socket, EmbeddingRequestHandler) as server:
+        server.embedding_model = embedding_model
+        print(f"✅ Embedding server listening on {args.socket}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n👋 Shutting down embedding server")
+        finally:
+            os.unlink(args.socket)
+
+if __name__ == "__main__":
+    main()
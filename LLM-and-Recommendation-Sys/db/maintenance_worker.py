@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""
+Background worker for long-running database maintenance.
+
+VACUUM/ANALYZE and TRUNCATE on the embedding tables can take minutes. Instead
+of blocking the caller, db.utils.optimize_database(background=True) and
+db.utils.truncate_table(..., background=True) send a NOTIFY on
+MAINTENANCE_CHANNEL and return immediately; this worker LISTENs on that
+channel and runs the operations one at a time on its own connection.
+
+Payloads:
+    vacuum_analyze            VACUUM (ANALYZE) the whole database
+    vacuum_analyze:<table>    VACUUM (ANALYZE) one table
+    truncate:<table>          TRUNCATE one table (RESTART IDENTITY CASCADE)
+
+Usage:
+python maintenance_worker.py [--parallel 4]
+"""
+import os
+import sys
+import argparse
+import select
+import time
+import psycopg2
+from psycopg2 import sql
+
+# Add the parent directory to sys.path to import local modules
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, parent_dir)
+
+from db.connection import create_db_connection
+from db.utils import MAINTENANCE_CHANNEL
+
+# Tables maintenance requests may name; anything else is ignored
+MAINTENANCE_TABLES = {"products", "concepts", "users"}
+
+# Parallel index vacuum workers (VACUUM PARALLEL, PostgreSQL 13+)
+VACUUM_PARALLEL_WORKERS = 4
+
+# Seconds to wait for a notification before checking the connection again
+LISTEN_TIMEOUT = 60
+
+# Seconds to wait before reconnecting after the connection was lost
+RECONNECT_DELAY = 5
+
+# VACUUM (PARALLEL n) needs PostgreSQL 13+
+VACUUM_PARALLEL_MIN_VERSION = 130000
+
+
+def run_maintenance(conn, payload, parallel_workers):
+    """
+    Run one maintenance request.
+
+    Args:
+        conn: Autocommit PostgreSQL connection
+        payload: Notification payload (see module docstring)
+        parallel_workers: Parallel workers for VACUUM (ignored before PostgreSQL 13)
+    """
+    operation, _, table_name = payload.partition(":")
+    if table_name and table_name not in MAINTENANCE_TABLES:
+        print(f"⚠️ Ignoring maintenance request for unknown table: {table_name}")
+        return
+
+    target = sql.SQL(" {}").format(sql.Identifier(table_name)) if table_name else sql.SQL("")
+
+    with conn.cursor() as cursor:
+        if operation == "vacuum_analyze":
+            print(f"🔧 Running VACUUM (ANALYZE) on {table_name or 'database'}...")
+            if conn.server_version >= VACUUM_PARALLEL_MIN_VERSION:
+                cursor.execute(sql.SQL("VACUUM (ANALYZE, PARALLEL {}){}").format(
+                    sql.Literal(parallel_workers), target))
+            else:
+                cursor.execute(sql.SQL("VACUUM (ANALYZE){}").format(target))
+        elif operation == "truncate" and table_name:
+            print(f"🔧 Truncating {table_name}...")
+            cursor.execute(sql.SQL("TRUNCATE TABLE {} RESTART IDENTITY CASCADE").format(
+                sql.Identifier(table_name)))
+        else:
+            print(f"⚠️ Ignoring unknown maintenance request: {payload}")
+            return
+
+    print(f"✅ Maintenance request completed: {payload}")
+
+
+def connect_and_listen():
+    """
+    Open the worker's connection and LISTEN on the maintenance channel.
+
+    Returns:
+        Autocommit connection, or None if the database is unreachable
+    """
+    # A dedicated connection: it is held for the worker's lifetime, so it
+    # should not take a slot in the shared pool
+    conn = create_db_connection()
+    if conn is None:
+        return None
+    try:
+        conn.autocommit = True  # VACUUM cannot run inside a transaction block
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(MAINTENANCE_CHANNEL)))
+    except psycopg2.Error as e:
+        print(f"❌ Could not LISTEN on {MAINTENANCE_CHANNEL}: {e}")
+        conn.close()
+        return None
+    print(f"👂 Listening for maintenance requests on {MAINTENANCE_CHANNEL}")
+    return conn
+
+
+def check_connection(conn):
+    """Run a trivial query so a dropped connection raises instead of waiting silently."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Run database maintenance requested via NOTIFY.")
+    parser.add_argument("--parallel", type=int, default=VACUUM_PARALLEL_WORKERS,
+                        help="Parallel workers for VACUUM")
+    return parser.parse_args()
+
+
+def main():
+    """Listen for maintenance requests and run them until interrupted."""
+    args = parse_args()
+
+    conn = connect_and_listen()
+    if conn is None:
+        return
+
+    try:
+        while True:
+            try:
+                if select.select([conn], [], [], LISTEN_TIMEOUT) == ([], [], []):
+                    check_connection(conn)
+                    continue
+                conn.poll()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                # Connection lost: reconnect and LISTEN again (notifications
+                # sent meanwhile are lost, as with any LISTEN/NOTIFY consumer)
+                print(f"⚠️ Lost database connection: {e}; reconnecting...")
+                conn.close()
+                conn = None
+                while conn is None:
+                    time.sleep(RECONNECT_DELAY)
+                    conn = connect_and_listen()
+                continue
+
+            while conn.notifies:
+                notification = conn.notifies.pop(0)
+                try:
+                    run_maintenance(conn, notification.payload, args.parallel)
+                except Exception as e:
+                    print(f"❌ Maintenance request {notification.payload} failed: {e}")
+    except KeyboardInterrupt:
+        print("\n👋 Stopping maintenance worker")
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
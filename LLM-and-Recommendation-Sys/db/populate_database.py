@@ -12,7 +12,8 @@ This script:
 Table Schemas:
 PRODUCTS:
 - id (serial), name, key_benefits, description, active_content
-- ingredients_text, how_to_use, price, stock_status, is_on_sale, country
+- ingredients_text, how_to_use, time_of_use, price, stock_status, is_on_sale, country
+- embeddings_text (generated from the text fields)
 - embedding (vector), created_at, updated_at
 
 CONCEPTS:  
@@ -29,8 +30,10 @@ import os
 import sys
 import json
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
+from psycopg2.extras import execute_values
 
 # Add the parent directory to sys.path to import local modules
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -38,7 +41,7 @@ sys.path.insert(0, parent_dir)
 
 # Import local modules using new connection system
 from db.connection import get_database_manager, test_db_connection
-from db.utils import check_table_exists, truncate_table, get_table_row_count
+from db.utils import check_table_exists, truncate_table, get_table_statistics, analyze_tables
 
 
 def load_products_from_json(filepath: str) -> List[Dict[str, Any]]:
@@ -109,7 +112,31 @@ def load_concepts_from_json(filepath: str) -> List[Dict[str, Any]]:
         return []
 
 
-def extract_product_data(product: Dict[str, Any]) -> Dict[str, Any]:
+def _encode_json_field(value, default):
+    """Serialize a list/dict field to JSON, falling back to default when empty."""
+    return json.dumps(value) if value else default
+
+
+# Encoder per exact value type used by safe_get; any other type falls back to str()
+_SAFE_GET_ENCODERS = {
+    str: lambda value, default: value,
+    list: _encode_json_field,
+    dict: _encode_json_field,
+}
+
+
+# Column order shared by extract_product_data and the products INSERT statement
+PRODUCT_COLUMNS = (
+    'id', 'name', 'key_benefits', 'description', 'active_content',
+    'ingredients_text', 'how_to_use', 'time_of_use', 'price', 'stock_status',
+    'is_on_sale', 'country'
+)
+
+# Column order shared by extract_concept_data and the concepts INSERT statement
+CONCEPT_COLUMNS = ('id', 'concept_type', 'name', 'description')
+
+
+def extract_product_data(product: Dict[str, Any]) -> Tuple:
     """
     Extract and clean product data for the products table schema.
     
@@ -117,14 +144,15 @@ def extract_product_data(product: Dict[str, Any]) -> Dict[str, Any]:
         product: Raw product dictionary from cache
         
     Returns:
-        Cleaned product data dictionary
+        Tuple of cleaned product values ordered as PRODUCT_COLUMNS
     """
     def safe_get(data, key, default=""):
         """Safely get a value from dictionary with fallbacks."""
         value = data.get(key, default)
-        if isinstance(value, (list, dict)):
-            return json.dumps(value) if value else default
-        return str(value) if value is not None else default
+        if value is None:
+            return default
+        encoder = _SAFE_GET_ENCODERS.get(type(value))
+        return encoder(value, default) if encoder else str(value)
     
     def safe_price(data, price_key, default=0.0):
         """Safely extract price as numeric value."""
@@ -134,60 +162,33 @@ def extract_product_data(product: Dict[str, Any]) -> Dict[str, Any]:
         except (ValueError, TypeError):
             return default
     
-    # Map product cache fields to database schema
-    extracted_data = {
-        'id': product.get('id'),  # Include the original ID from JSON
-        'name': safe_get(product, 'name', 'Unknown Product'),
-        'key_benefits': safe_get(product, 'keyBenefits') or safe_get(product, 'key_benefits'),
-        'description': safe_get(product, 'description'),
-        'active_content': safe_get(product, 'activeContent') or safe_get(product, 'active_content'),
-        'ingredients_text': safe_get(product, 'contents') or safe_get(product, 'ingredients'),
-        'how_to_use': safe_get(product, 'howToUse') or safe_get(product, 'how_to_use'),
-        'price': safe_price(product, 'price'),
-        'stock_status': product.get('stockStatus', 0),  # 0 = in stock
-        'is_on_sale': safe_price(product, 'discountedPrice') > 0,
-        'country': safe_get(product, 'country', 'Turkey')  # Default based on Purgene brand
-    }
-    
-    # Create embeddings_text by concatenating specified fields
-    embeddings_parts = []
-    
-    # 1. keyBenefits, activeContent, name
-    key_benefits = safe_get(product, 'keyBenefits') or safe_get(product, 'key_benefits')
-    active_content = safe_get(product, 'activeContent') or safe_get(product, 'active_content')
+    # Map product cache fields to database schema (each field is read once)
     name = safe_get(product, 'name', 'Unknown Product')
-    
-    if key_benefits:
-        embeddings_parts.append(f"Key Benefits: {key_benefits}")
-    if active_content:
-        embeddings_parts.append(f"Active Content: {active_content}")
-    if name:
-        embeddings_parts.append(f"Product Name: {name}")
-    
-    # 2. description
+    key_benefits = safe_get(product, 'keyBenefits') or safe_get(product, 'key_benefits')
     description = safe_get(product, 'description')
-    if description:
-        embeddings_parts.append(f"Description: {description}")
-    
-    # 3. contents, howToUse, timeOfUse
+    active_content = safe_get(product, 'activeContent') or safe_get(product, 'active_content')
     contents = safe_get(product, 'contents') or safe_get(product, 'ingredients')
     how_to_use = safe_get(product, 'howToUse') or safe_get(product, 'how_to_use')
     time_of_use = safe_get(product, 'timeOfUse') or safe_get(product, 'time_of_use')
     
-    if contents:
-        embeddings_parts.append(f"Ingredients: {contents}")
-    if how_to_use:
-        embeddings_parts.append(f"How to Use: {how_to_use}")
-    if time_of_use:
-        embeddings_parts.append(f"Time of Use: {time_of_use}")
-    
-    # Join all parts with double newline for clear separation
-    extracted_data['embeddings_text'] = "\n\n".join(embeddings_parts)
-    
-    return extracted_data
+    # embeddings_text is a generated column built from these fields by the database
+    return (
+        product.get('id'),  # Include the original ID from JSON
+        name,
+        key_benefits,
+        description,
+        active_content,
+        contents,
+        how_to_use,
+        time_of_use,
+        safe_price(product, 'price'),
+        product.get('stockStatus', 0),  # 0 = in stock
+        safe_price(product, 'discountedPrice') > 0,
+        safe_get(product, 'country', 'Turkey')  # Default based on Purgene brand
+    )
 
 
-def extract_concept_data(concept: Dict[str, Any]) -> Dict[str, Any]:
+def extract_concept_data(concept: Dict[str, Any]) -> Tuple:
     """
     Extract and clean concept data for the concepts table schema.
     
@@ -195,14 +196,14 @@ def extract_concept_data(concept: Dict[str, Any]) -> Dict[str, Any]:
         concept: Raw concept dictionary
         
     Returns:
-        Cleaned concept data dictionary
+        Tuple of cleaned concept values ordered as CONCEPT_COLUMNS
     """
-    return {
-        'id': concept.get('id'),
-        'concept_type': concept.get('type', 'skin_concern'),  # Use type from JSON, default to skin_concern
-        'name': concept.get('name', ''),
-        'description': concept.get('description', '')
-    }
+    return (
+        concept.get('id'),
+        concept.get('type', 'skin_concern'),  # Use type from JSON, default to skin_concern
+        concept.get('name', ''),
+        concept.get('description', '')
+    )
 
 
 def extract_user_data(user_preferences: Dict[str, Any]) -> Dict[str, Any]:
@@ -299,13 +300,9 @@ def insert_products_batch(products: List[Dict[str, Any]], batch_size: int = 500)
                     insert_query = """
                         INSERT INTO products (
                             id, name, key_benefits, description, active_content, 
-                            ingredients_text, how_to_use, embeddings_text, price, stock_status, 
+                            ingredients_text, how_to_use, time_of_use, price, stock_status, 
                             is_on_sale, country
-                        ) VALUES (
-                            %(id)s, %(name)s, %(key_benefits)s, %(description)s, %(active_content)s,
-                            %(ingredients_text)s, %(how_to_use)s, %(embeddings_text)s, %(price)s, %(stock_status)s,
-                            %(is_on_sale)s, %(country)s
-                        )
+                        ) VALUES %s
                         ON CONFLICT (id) DO UPDATE SET
                             name = EXCLUDED.name,
                             key_benefits = EXCLUDED.key_benefits,
@@ -313,7 +310,7 @@ def insert_products_batch(products: List[Dict[str, Any]], batch_size: int = 500)
                             active_content = EXCLUDED.active_content,
                             ingredients_text = EXCLUDED.ingredients_text,
                             how_to_use = EXCLUDED.how_to_use,
-                            embeddings_text = EXCLUDED.embeddings_text,
+                            time_of_use = EXCLUDED.time_of_use,
                             price = EXCLUDED.price,
                             stock_status = EXCLUDED.stock_status,
                             is_on_sale = EXCLUDED.is_on_sale,
@@ -325,7 +322,7 @@ def insert_products_batch(products: List[Dict[str, Any]], batch_size: int = 500)
                     for product in batch:
                         try:
                             extracted_data = extract_product_data(product)
-                            if extracted_data['id'] is not None:  # Ensure we have an ID
+                            if extracted_data[0] is not None:  # Ensure we have an ID
                                 batch_data.append(extracted_data)
                             else:
                                 print(f"⚠️ Skipping product without ID: {product.get('name', 'Unknown')}")
@@ -334,7 +331,9 @@ def insert_products_batch(products: List[Dict[str, Any]], batch_size: int = 500)
                             continue
                     
                     if batch_data:
-                        cursor.executemany(insert_query, batch_data)
+                        # One multi-row upsert per batch; a row may only be upserted once per statement
+                        batch_data = list({row[0]: row for row in batch_data}.values())
+                        execute_values(cursor, insert_query, batch_data, page_size=len(batch_data))
                         conn.commit()
                         inserted_count = len(batch_data)
                         total_inserted += inserted_count
@@ -372,9 +371,7 @@ def insert_concepts_batch(concepts: List[Dict[str, Any]]) -> int:
                 insert_query = """
                     INSERT INTO concepts (
                         id, concept_type, name, description
-                    ) VALUES (
-                        %(id)s, %(concept_type)s, %(name)s, %(description)s
-                    )
+                    ) VALUES %s
                     ON CONFLICT (id) DO UPDATE SET
                         concept_type = EXCLUDED.concept_type,
                         name = EXCLUDED.name,
@@ -386,7 +383,7 @@ def insert_concepts_batch(concepts: List[Dict[str, Any]]) -> int:
                 for concept in concepts:
                     try:
                         extracted_data = extract_concept_data(concept)
-                        if extracted_data['id'] is not None:  # Ensure we have an ID
+                        if extracted_data[0] is not None:  # Ensure we have an ID
                             batch_data.append(extracted_data)
                         else:
                             print(f"⚠️ Skipping concept without ID: {concept.get('name', 'Unknown')}")
@@ -395,7 +392,9 @@ def insert_concepts_batch(concepts: List[Dict[str, Any]]) -> int:
                         continue
                 
                 if batch_data:
-                    cursor.executemany(insert_query, batch_data)
+                    # Single multi-row upsert; a row may only be upserted once per statement
+                    batch_data = list({row[0]: row for row in batch_data}.values())
+                    execute_values(cursor, insert_query, batch_data, page_size=len(batch_data))
                     conn.commit()
                     print(f"✅ Successfully inserted/updated {len(batch_data)} concepts")
                     return len(batch_data)
@@ -430,9 +429,7 @@ def insert_users_batch(user_profiles: List[Dict[str, Any]]) -> int:
                 insert_query = """
                     INSERT INTO users (
                         embedding_text
-                    ) VALUES (
-                        %(embedding_text)s
-                    )
+                    ) VALUES %s
                 """
                 
                 batch_data = []
@@ -448,7 +445,10 @@ def insert_users_batch(user_profiles: List[Dict[str, Any]]) -> int:
                         continue
                 
                 if batch_data:
-                    cursor.executemany(insert_query, batch_data)
+                    execute_values(
+                        cursor, insert_query, batch_data,
+                        template="(%(embedding_text)s)", page_size=len(batch_data)
+                    )
                     conn.commit()
                     print(f"✅ Successfully inserted {len(batch_data)} user profiles")
                     return len(batch_data)
@@ -492,27 +492,21 @@ def get_file_paths() -> Tuple[str, str]:
 
 
 def show_table_statistics():
-    """Show current table statistics."""
+    """Show current table statistics (approximate counts from planner statistics)."""
     print("\n📊 Current Table Statistics:")
     print("-" * 40)
     
+    stats = get_table_statistics(['products', 'concepts', 'users'])
+    
     for table_name in ['products', 'concepts', 'users']:
-        if check_table_exists(table_name):
-            row_count = get_table_row_count(table_name)
-            
-            # Check embeddings if table has them
+        table_stats = stats.get(table_name, {'exists': False})
+        if table_stats['exists']:
             embedding_info = ""
-            try:
-                with get_database_manager().get_db_connection() as conn:
-                    with conn.cursor() as cursor:
-                        cursor.execute(f"SELECT COUNT(*) FROM {table_name} WHERE embedding IS NOT NULL")
-                        with_embeddings = cursor.fetchone()[0]
-                        if with_embeddings > 0:
-                            embedding_info = f" ({with_embeddings} with embeddings)"
-            except:
-                pass
+            with_embeddings = table_stats['with_embeddings']
+            if with_embeddings:
+                embedding_info = f" (~{with_embeddings} with embeddings)"
             
-            print(f"  ✅ {table_name}: {row_count} rows{embedding_info}")
+            print(f"  ✅ {table_name}: ~{table_stats['row_count']} rows{embedding_info}")
         else:
             print(f"  ❌ {table_name}: table does not exist")
 
@@ -583,6 +577,11 @@ def main():
     
     success_results = {}
     
+    # Products are inserted on a worker thread so the concepts load and insert
+    # overlap with the products round-trips (each uses its own pooled connection)
+    executor = ThreadPoolExecutor(max_workers=1)
+    products_future = None
+    
     # Handle products
     if not args.concepts_only:
         print(f"\n🛍️ PRODUCTS TABLE POPULATION")
@@ -609,23 +608,13 @@ def main():
                 print("\n🔍 Dry run mode - showing sample product data:")
                 print("-" * 30)
                 sample_product = extract_product_data(products[0])
-                for key, value in sample_product.items():
+                for key, value in zip(PRODUCT_COLUMNS, sample_product):
                     display_value = str(value)[:80] + '...' if len(str(value)) > 80 else str(value)
                     print(f"  {key}: {display_value}")
             else:
-                # Insert products
-                start_time = datetime.now()
-                inserted_count = insert_products_batch(products, args.batch_size)
-                end_time = datetime.now()
-                duration = end_time - start_time
-                
-                print(f"\n🎯 Products Summary:")
-                print(f"  Products processed: {len(products)}")
-                print(f"  Products inserted: {inserted_count}")
-                print(f"  Success rate: {(inserted_count/len(products)*100):.1f}%")
-                print(f"  Processing time: {duration.total_seconds():.2f} seconds")
-                
-                success_results['products'] = inserted_count > 0
+                # Insert products in the background; the summary is reported once concepts are done
+                products_start_time = datetime.now()
+                products_future = executor.submit(insert_products_batch, products, args.batch_size)
     
     # Handle concepts
     if not args.products_only:
@@ -663,7 +652,7 @@ def main():
                 print("\n🔍 Dry run mode - showing sample concept data:")
                 print("-" * 30)
                 sample_concept = extract_concept_data(concepts[0])
-                for key, value in sample_concept.items():
+                for key, value in zip(CONCEPT_COLUMNS, sample_concept):
                     display_value = str(value)[:80] + '...' if len(str(value)) > 80 else str(value)
                     print(f"  {key}: {display_value}")
             else:
@@ -681,6 +670,21 @@ def main():
                 
                 success_results['concepts'] = inserted_count > 0
     
+    # Wait for the background products insert
+    if products_future is not None:
+        inserted_count = products_future.result()
+        end_time = datetime.now()
+        duration = end_time - products_start_time
+        
+        print(f"\n🎯 Products Summary:")
+        print(f"  Products processed: {len(products)}")
+        print(f"  Products inserted: {inserted_count}")
+        print(f"  Success rate: {(inserted_count/len(products)*100):.1f}%")
+        print(f"  Processing time: {duration.total_seconds():.2f} seconds")
+        
+        success_results['products'] = inserted_count > 0
+    executor.shutdown()
+    
     # Handle users
     if not args.products_only and not args.concepts_only:
         print(f"\n👤 USERS TABLE POPULATION")
@@ -745,8 +749,10 @@ def main():
             
             success_results['users'] = inserted_count > 0
     
-    # Show final statistics if not dry run
+    # Show final statistics if not dry run; analyze first so the planner
+    # estimates reflect the rows just truncated and inserted
     if not args.dry_run:
+        analyze_tables(list(success_results))
         show_table_statistics()
     
     # Overall success
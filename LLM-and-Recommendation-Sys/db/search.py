@@ -10,18 +10,30 @@ This script:
 
 Usage:
 python search.py "skincare for dry skin" [--top_n 5] [--table all|products|skin_conditions]
+python search.py "dry skin" "oily skin" [--top_n 5]
+python search.py --interactive [--top_n 5]
 
 Arguments:
-query: The search query
+query: One or more search queries (several queries are embedded and searched as one batch)
 --top_n: Number of top results to return (default: 5)
 --table: Which table to search (default: all)
+--interactive: Read one query per line from stdin, keeping the model loaded between queries
+--onnx: Encode queries with the int8-quantized ONNX model (requires optimum[onnxruntime])
 """
 import os
 import sys
 import argparse
+import functools
+import weakref
+import numpy as np
 import psycopg2
 import json
 
+try:
+    import orjson  # Optional: faster JSON encoding for the results file
+except ImportError:
+    orjson = None
+
 # Add the parent directory to sys.path to import local modules
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, parent_dir)
@@ -29,27 +41,160 @@ sys.path.insert(0, parent_dir)
 # Import local modules
 import rag.core.config as config
 
+# Default HNSW search beam width; higher values trade query speed for recall
+HNSW_EF_SEARCH = 100
+
+# IVFFlat lists probed per query on the concepts index
+IVFFLAT_PROBES = 8
+
+# CPU threads for query encoding; gains flatten out past the physical core count
+EMBEDDING_NUM_THREADS = min(8, os.cpu_count() or 1)
+
+# Mini-batch size for embed_documents; sentence-transformers sorts inputs by length
+# before batching, so each mini-batch pads only to its own longest query
+EMBEDDING_BATCH_SIZE = 32
+
+# Dynamically int8-quantized ONNX export shipped with the sentence-transformers models
+ONNX_QUANTIZED_MODEL_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+# Concept descriptions are cut to this many characters server-side before transfer
+CONCEPT_DESCRIPTION_PREVIEW = 200
+
+# Single-table searches, prepared once per connection so the plan is reused across queries
+PREPARE_SEARCH_PRODUCTS = """
+PREPARE search_products (halfvec, int) AS
+SELECT 
+    id, 
+    name, 
+    key_benefits,
+    description,
+    active_content,
+    1 - (embedding <=> $1) AS similarity
+FROM products
+WHERE embedding IS NOT NULL
+ORDER BY embedding <=> $1
+LIMIT $2
+"""
+
+PREPARE_SEARCH_CONCEPTS = """
+PREPARE search_concepts (halfvec, int) AS
+SELECT 
+    id, 
+    name,
+    LEFT(description, {preview}) AS description,
+    char_length(description) > {preview} AS description_truncated,
+    concept_type,
+    1 - (embedding <=> $1) AS similarity
+FROM concepts
+WHERE embedding IS NOT NULL
+ORDER BY embedding <=> $1
+LIMIT $2
+""".format(preview=CONCEPT_DESCRIPTION_PREVIEW)
+
+# Pooled connections that already have the pgvector types and search statements set up
+_prepared_connections = weakref.WeakSet()
+
+def prepare_search_connection(conn):
+    """
+    Set up a connection for searching, once per connection.
+    
+    Prepares the single-table search statements. Prepared statements live for
+    the session, so pooled connections keep them. Numpy arrays bind straight
+    as query parameters through the adapters the pool registers.
+    
+    Args:
+        conn: PostgreSQL connection object
+    """
+    if conn not in _prepared_connections:
+        with conn.cursor() as cursor:
+            cursor.execute(PREPARE_SEARCH_PRODUCTS)
+            cursor.execute(PREPARE_SEARCH_CONCEPTS)
+        _prepared_connections.add(conn)
+
 def parse_args():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description="Search using vector similarity.")
-    parser.add_argument("query", type=str, help="Search query text")
+    parser.add_argument("query", type=str, nargs="*", help="Search query text (several queries are searched as a batch)")
     parser.add_argument("--top_n", type=int, default=5, help="Number of top results to return")
     parser.add_argument("--table", type=str, default="all", choices=["all", "products", "concepts"],
                         help="Which table to search")
     parser.add_argument("--output", type=str, default="search_results.json", help="Output JSON file")
-    return parser.parse_args()
+    parser.add_argument("--ef_search", type=int, default=HNSW_EF_SEARCH,
+                        help="HNSW candidate list size used at query time")
+    parser.add_argument("--probes", type=int, default=IVFFLAT_PROBES,
+                        help="IVFFlat lists probed per query on the concepts index")
+    parser.add_argument("--interactive", action="store_true",
+                        help="Serve queries from stdin, reusing the loaded model and pooled connections")
+    parser.add_argument("--onnx", action="store_true",
+                        help="Encode queries with the int8-quantized ONNX Runtime model instead of PyTorch")
+    args = parser.parse_args()
+    if not args.query and not args.interactive:
+        parser.error("a query is required unless --interactive is given")
+    return args
 
-def create_embeddings_model():
-    """Create and return the embedding model."""
+@functools.lru_cache(maxsize=1)
+def create_embeddings_model(use_onnx=False):
+    """
+    Create and return the embedding model (loaded once per process).
+    
+    Args:
+        use_onnx: Run the int8-quantized ONNX export on ONNX Runtime's CPU provider
+            instead of eager PyTorch (requires optimum[onnxruntime])
+        
+    Returns:
+        HuggingFaceEmbeddings instance
+    """
+    # OpenMP/MKL read these when torch is first imported
+    os.environ.setdefault("OMP_NUM_THREADS", str(EMBEDDING_NUM_THREADS))
+    os.environ.setdefault("MKL_NUM_THREADS", str(EMBEDDING_NUM_THREADS))
+    import torch
     from langchain_community.embeddings import HuggingFaceEmbeddings
     
-    print(f"Loading embedding model: {config.SENTENCE_TRANSFORMER_MODEL_NAME}...")
+    torch.set_num_threads(EMBEDDING_NUM_THREADS)
+    
+    model_kwargs = {'device': 'cpu'}  # Use 'cuda' for GPU if available
+    if use_onnx:
+        # Forwarded to SentenceTransformer, which handles tokenization and mean pooling
+        model_kwargs['backend'] = 'onnx'
+        model_kwargs['model_kwargs'] = {
+            'file_name': ONNX_QUANTIZED_MODEL_FILE,
+            'provider': 'CPUExecutionProvider'
+        }
+    
+    print(f"Loading embedding model: {config.SENTENCE_TRANSFORMER_MODEL_NAME}"
+          f"{' (ONNX int8)' if use_onnx else ''}...")
     return HuggingFaceEmbeddings(
         model_name=config.SENTENCE_TRANSFORMER_MODEL_NAME,
-        model_kwargs={'device': 'cpu'}  # Use 'cuda' for GPU if available
+        model_kwargs=model_kwargs,
+        encode_kwargs={'batch_size': EMBEDDING_BATCH_SIZE}
     )
 
-def search_products(conn, query_embedding, top_n):
+def product_row_to_result(row):
+    """Convert a (id, name, key_benefits, description, active_content, similarity) row to a result dict."""
+    product_id, name, key_benefits, description, active_content, similarity = row
+    return {
+        "id": product_id,
+        "name": name,
+        "key_benefits": key_benefits,
+        "description": description,
+        "active_content": active_content,
+        "similarity": float(similarity),  # Convert Decimal to float for JSON serialization
+        "type": "product"
+    }
+
+def concept_row_to_result(row):
+    """Convert a (id, name, description, description_truncated, concept_type, similarity) row to a result dict."""
+    concept_id, name, description, description_truncated, concept_type, similarity = row
+    return {
+        "id": concept_id,
+        "name": name,
+        "description": description + "..." if description_truncated else description,  # Truncated in SQL
+        "concept_type": concept_type,
+        "similarity": float(similarity),  # Convert Decimal to float for JSON serialization
+        "type": "concept"
+    }
+
+def search_products(conn, query_embedding, top_n, ef_search=HNSW_EF_SEARCH):
     """
     Search for products by vector similarity.
     
@@ -57,44 +202,22 @@ def search_products(conn, query_embedding, top_n):
         conn: PostgreSQL connection object
         query_embedding: Vector embedding of the search query
         top_n: Number of top results to return
+        ef_search: HNSW candidate list size for this query
         
     Returns:
         List of dictionaries with product info and similarity score
     """
-    # Convert embedding to string format that pgvector can parse
-    query_embedding_str = str(query_embedding)
+    prepare_search_connection(conn)
+    query_vector = np.asarray(query_embedding, dtype=np.float32)
     
     with conn.cursor() as cursor:
-        cursor.execute("""
-        SELECT 
-            id, 
-            name, 
-            key_benefits,
-            description,
-            active_content,
-            1 - (embedding <=> %s::vector) AS similarity
-        FROM products
-        WHERE embedding IS NOT NULL
-        ORDER BY similarity DESC
-        LIMIT %s
-        """, (query_embedding_str, top_n))
+        # Scoped to the current transaction so pooled connections keep the server default
+        cursor.execute("SET LOCAL hnsw.ef_search = %s", (ef_search,))
+        cursor.execute("EXECUTE search_products (%s, %s)", (query_vector, top_n))
         
-        results = []
-        for row in cursor.fetchall():
-            product_id, name, key_benefits, description, active_content, similarity = row
-            results.append({
-                "id": product_id,
-                "name": name,
-                "key_benefits": key_benefits,
-                "description": description,
-                "active_content": active_content,
-                "similarity": float(similarity),  # Convert Decimal to float for JSON serialization
-                "type": "product"
-            })
-        
-        return results
+        return [product_row_to_result(row) for row in cursor.fetchall()]
 
-def search_concepts(conn, query_embedding, top_n):
+def search_concepts(conn, query_embedding, top_n, probes=IVFFLAT_PROBES):
     """
     Search for concepts by vector similarity.
     
@@ -102,103 +225,275 @@ def search_concepts(conn, query_embedding, top_n):
         conn: PostgreSQL connection object
         query_embedding: Vector embedding of the search query
         top_n: Number of top results to return
+        probes: IVFFlat lists to probe for this query
         
     Returns:
         List of dictionaries with concept info and similarity score
     """
-    # Convert embedding to string format that pgvector can parse
-    query_embedding_str = str(query_embedding)
+    prepare_search_connection(conn)
+    query_vector = np.asarray(query_embedding, dtype=np.float32)
     
     with conn.cursor() as cursor:
+        # Scoped to the current transaction so pooled connections keep the server default
+        cursor.execute("SET LOCAL ivfflat.probes = %s", (probes,))
+        cursor.execute("EXECUTE search_concepts (%s, %s)", (query_vector, top_n))
+        
+        return [concept_row_to_result(row) for row in cursor.fetchall()]
+
+def search_all(conn, query_embedding, top_n, ef_search=HNSW_EF_SEARCH, probes=IVFFLAT_PROBES):
+    """
+    Search products and concepts together and merge the top N on the server.
+    
+    Both tables are searched in one UNION ALL statement; each branch is tagged
+    with its result type so rows can be converted the same way as the
+    single-table searches.
+    
+    Args:
+        conn: PostgreSQL connection object
+        query_embedding: Query vector embedding
+        top_n: Number of top results to return overall
+        ef_search: HNSW candidate list size for the products search
+        probes: IVFFlat lists to probe for the concepts search
+        
+    Returns:
+        List of product and concept results ordered by similarity
+    """
+    prepare_search_connection(conn)
+    query_vector = np.asarray(query_embedding, dtype=np.float32)
+    
+    with conn.cursor() as cursor:
+        # Scoped to the current transaction so pooled connections keep the server default
+        cursor.execute("SET LOCAL hnsw.ef_search = %s", (ef_search,))
+        cursor.execute("SET LOCAL ivfflat.probes = %s", (probes,))
+        
+        # Columns a table lacks are padded with NULL so both branches share one row shape
         cursor.execute("""
-        SELECT 
+        (SELECT 
+            'product'::text AS type,
             id, 
-            name,
+            name, 
+            key_benefits,
             description,
+            NULL::boolean AS description_truncated,
+            active_content,
+            NULL::text AS concept_type,
+            1 - (embedding <=> %(query)s::halfvec) AS similarity
+        FROM products
+        WHERE embedding IS NOT NULL
+        ORDER BY embedding <=> %(query)s::halfvec
+        LIMIT %(top_n)s)
+        UNION ALL
+        (SELECT 
+            'concept'::text AS type,
+            id, 
+            name,
+            NULL::text AS key_benefits,
+            LEFT(description, %(preview)s) AS description,
+            char_length(description) > %(preview)s AS description_truncated,
+            NULL::text AS active_content,
             concept_type,
-            1 - (embedding <=> %s::vector) AS similarity
+            1 - (embedding <=> %(query)s::halfvec) AS similarity
         FROM concepts
         WHERE embedding IS NOT NULL
+        ORDER BY embedding <=> %(query)s::halfvec
+        LIMIT %(top_n)s)
         ORDER BY similarity DESC
-        LIMIT %s
-        """, (query_embedding_str, top_n))
+        LIMIT %(top_n)s
+        """, {"query": query_vector, "top_n": top_n, "preview": CONCEPT_DESCRIPTION_PREVIEW})
         
         results = []
         for row in cursor.fetchall():
-            concept_id, name, description, concept_type, similarity = row
-            results.append({
-                "id": concept_id,
-                "name": name,
-                "description": description[:200] + "..." if len(description) > 200 else description,  # Truncate long descriptions
-                "concept_type": concept_type,
-                "similarity": float(similarity),  # Convert Decimal to float for JSON serialization
-                "type": "concept"
-            })
+            (result_type, item_id, name, key_benefits, description, description_truncated,
+             active_content, concept_type, similarity) = row
+            if result_type == "product":
+                results.append(product_row_to_result(
+                    (item_id, name, key_benefits, description, active_content, similarity)))
+            else:
+                results.append(concept_row_to_result(
+                    (item_id, name, description, description_truncated, concept_type, similarity)))
         
         return results
 
-def main():
-    """Main function to search for products and concepts."""
-    args = parse_args()
+def search_many(conn, query_embeddings, top_n, table="all", ef_search=HNSW_EF_SEARCH,
+                probes=IVFFLAT_PROBES):
+    """
+    Search several query embeddings with one SQL round-trip per table.
+    
+    Each query vector is joined LATERALly against the table, so every query
+    still gets its own top-N nearest neighbours from the vector index.
     
+    Args:
+        conn: PostgreSQL connection object
+        query_embeddings: List of query vector embeddings
+        top_n: Number of top results to return per query
+        table: Which table to search ("all", "products" or "concepts")
+        ef_search: HNSW candidate list size for the products search
+        probes: IVFFlat lists to probe for the concepts search
+        
+    Returns:
+        List with one result list per query embedding, in input order
+    """
+    results = [[] for _ in query_embeddings]
+    if not query_embeddings:
+        return results
+    
+    prepare_search_connection(conn)
+    query_vectors = [np.asarray(embedding, dtype=np.float32) for embedding in query_embeddings]
+    
+    with conn.cursor() as cursor:
+        # Scoped to the current transaction so pooled connections keep the server default
+        cursor.execute("SET LOCAL hnsw.ef_search = %s", (ef_search,))
+        cursor.execute("SET LOCAL ivfflat.probes = %s", (probes,))
+        
+        if table in ["all", "products"]:
+            cursor.execute("""
+            SELECT q.idx, p.id, p.name, p.key_benefits, p.description, p.active_content, p.similarity
+            FROM unnest(%s::halfvec[]) WITH ORDINALITY AS q(vec, idx)
+            CROSS JOIN LATERAL (
+                SELECT 
+                    id, 
+                    name, 
+                    key_benefits,
+                    description,
+                    active_content,
+                    1 - (embedding <=> q.vec) AS similarity
+                FROM products
+                WHERE embedding IS NOT NULL
+                ORDER BY embedding <=> q.vec
+                LIMIT %s
+            ) p
+            ORDER BY q.idx, p.similarity DESC
+            """, (query_vectors, top_n))
+            for row in cursor.fetchall():
+                results[row[0] - 1].append(product_row_to_result(row[1:]))
+        
+        if table in ["all", "concepts"]:
+            cursor.execute("""
+            SELECT q.idx, c.id, c.name, c.description, c.description_truncated, c.concept_type, c.similarity
+            FROM unnest(%s::halfvec[]) WITH ORDINALITY AS q(vec, idx)
+            CROSS JOIN LATERAL (
+                SELECT 
+                    id, 
+                    name,
+                    LEFT(description, %s) AS description,
+                    char_length(description) > %s AS description_truncated,
+                    concept_type,
+                    1 - (embedding <=> q.vec) AS similarity
+                FROM concepts
+                WHERE embedding IS NOT NULL
+                ORDER BY embedding <=> q.vec
+                LIMIT %s
+            ) c
+            ORDER BY q.idx, c.similarity DESC
+            """, (query_vectors, CONCEPT_DESCRIPTION_PREVIEW, CONCEPT_DESCRIPTION_PREVIEW, top_n))
+            for row in cursor.fetchall():
+                results[row[0] - 1].append(concept_row_to_result(row[1:]))
+    
+    # Merge per query and keep the overall top_n when searching both tables
+    if table == "all":
+        for query_results in results:
+            query_results.sort(key=lambda x: x["similarity"], reverse=True)
+            del query_results[top_n:]
+    
+    return results
+
+def display_results(query, all_results):
+    """Print the ranked results for a single query with one write to stdout."""
+    separator = "-" * 80
+    lines = [f"\nTop {len(all_results)} results for '{query}':", separator]
+    
+    for i, result in enumerate(all_results, 1):
+        if result["type"] == "product":
+            result_type = "Product"
+            lines.append(f"{i}. [{result_type}] {result['name']} (ID: {result['id']})")
+            lines.append(f"   Similarity: {result['similarity']:.4f}")
+            
+            # key_benefits is flattened to TEXT at populate time, so it arrives as a plain string
+            key_benefits = result.get('key_benefits') or ''
+            if key_benefits:
+                lines.append(f"   Key Benefits: {key_benefits[:150]}..." if len(key_benefits) > 150 else f"   Key Benefits: {key_benefits}")
+        else:
+            result_type = "Concept"
+            lines.append(f"{i}. [{result_type}] {result['name']} (ID: {result['id']}) - {result['concept_type']}")
+            lines.append(f"   Similarity: {result['similarity']:.4f}")
+            lines.append(f"   Description: {result['description']}")
+            
+        lines.append(separator)
+    
+    sys.stdout.write("\n".join(lines) + "\n")
+
+def save_results(path, results):
+    """
+    Write results to a JSON file, using orjson when it is installed.
+    
+    Args:
+        path: Output file path
+        results: JSON-serializable results
+    """
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+def run_search(query, args):
+    """Embed a single query, search the requested tables and report the results."""
     # Import the new connection system
     from db.connection import get_database_manager
     
-    # Load embedding model and generate query embedding
-    embedding_model = create_embeddings_model()
-    print(f"Generating embedding for query: '{args.query}'")
-    query_embedding = embedding_model.embed_query(args.query)
+    # Load embedding model (cached after the first call) and generate query embedding
+    embedding_model = create_embeddings_model(args.onnx)
+    print(f"Generating embedding for query: '{query}'")
+    query_embedding = embedding_model.embed_query(query)
     
     # Connect to PostgreSQL and search
     print("Connecting to PostgreSQL...")
     try:
-        # Initialize results containers
-        product_results = []
-        concept_results = []
-        
-        # Search products if requested
-        if args.table in ["all", "products"]:
-            with get_database_manager().get_db_connection() as conn:
-                product_results = search_products(conn, query_embedding, args.top_n)
-            
-        # Search concepts if requested
-        if args.table in ["all", "concepts"]:
-            with get_database_manager().get_db_connection() as conn:
-                concept_results = search_concepts(conn, query_embedding, args.top_n)
-        
-        # Combine and sort results by similarity
-        all_results = product_results + concept_results
-        all_results.sort(key=lambda x: x["similarity"], reverse=True)
-        
-        # Limit to top_n overall if searching both tables
-        if args.table == "all":
-            all_results = all_results[:args.top_n]
-        
-        # Display results
-        print(f"\nTop {len(all_results)} results for '{args.query}':")
-        print("-" * 80)
-        
-        for i, result in enumerate(all_results, 1):
-            if result["type"] == "product":
-                result_type = "Product"
-                print(f"{i}. [{result_type}] {result['name']} (ID: {result['id']})")
-                print(f"   Similarity: {result['similarity']:.4f}")
-                
-                # Get key benefits if available
-                key_benefits = result.get('key_benefits', '')
-                if key_benefits:
-                    print(f"   Key Benefits: {key_benefits[:150]}..." if len(str(key_benefits)) > 150 else f"   Key Benefits: {key_benefits}")
+        with get_database_manager().get_db_connection() as conn:
+            if args.table == "all":
+                # Both tables in one round-trip, merged and limited server-side
+                all_results = search_all(conn, query_embedding, args.top_n, args.ef_search, args.probes)
+            elif args.table == "products":
+                all_results = search_products(conn, query_embedding, args.top_n, args.ef_search)
             else:
-                result_type = "Concept"
-                print(f"{i}. [{result_type}] {result['name']} (ID: {result['id']}) - {result['concept_type']}")
-                print(f"   Similarity: {result['similarity']:.4f}")
-                print(f"   Description: {result['description']}")
-                
-            print("-" * 80)
+                all_results = search_concepts(conn, query_embedding, args.top_n, args.probes)
+        
+        display_results(query, all_results)
         
         # Save results to file for reference
-        with open(args.output, 'w', encoding='utf-8') as f:
-            json.dump(all_results, f, indent=2, ensure_ascii=False)
+        save_results(args.output, all_results)
+        print(f"Detailed results saved to {args.output}")
+        
+    except Exception as e:
+        print(f"Error searching: {e}")
+        import traceback
+        traceback.print_exc()
+
+def run_batch_search(queries, args):
+    """Embed several queries in one batch and search them with a single round-trip per table."""
+    from db.connection import get_database_manager
+    
+    # Repeated queries are embedded and searched once, then fanned back out
+    unique_queries = list(dict.fromkeys(queries))
+    
+    embedding_model = create_embeddings_model(args.onnx)
+    print(f"Generating embeddings for {len(unique_queries)} queries...")
+    # Length-sorted, mini-batched encoding; embeddings come back in input order
+    query_embeddings = embedding_model.embed_documents(unique_queries)
+    
+    print("Connecting to PostgreSQL...")
+    try:
+        with get_database_manager().get_db_connection() as conn:
+            batch_results = search_many(conn, query_embeddings, args.top_n, args.table,
+                                        args.ef_search, args.probes)
+        results_by_query = dict(zip(unique_queries, batch_results))
+        
+        for query in queries:
+            display_results(query, results_by_query[query])
+        
+        # Save results to file for reference, keyed by query (one entry per distinct query)
+        save_results(args.output, results_by_query)
         print(f"Detailed results saved to {args.output}")
         
     except Exception as e:
@@ -206,5 +501,27 @@ def main():
         import traceback
         traceback.print_exc()
 
+def search_loop(args):
+    """Answer queries read from stdin until EOF or an empty line."""
+    # Warm the model before the first query arrives
+    create_embeddings_model(args.onnx)
+    print("Enter one query per line (empty line or Ctrl-D to quit).")
+    for line in sys.stdin:
+        query = line.strip()
+        if not query:
+            break
+        run_search(query, args)
+
+def main():
+    """Main function to search for products and concepts."""
+    args = parse_args()
+    
+    if args.interactive:
+        search_loop(args)
+    elif len(args.query) == 1:
+        run_search(args.query[0], args)
+    else:
+        run_batch_search(args.query, args)
+
 if __name__ == "__main__":
     main()
@@ -6,13 +6,17 @@ This script creates the main tables (products and concepts) with proper indexing
 and vector search capabilities using pgvector extension.
 
 Usage:
-    python table_creation.py [--drop-existing] [--create-indexes]
+    python table_creation.py [--drop-existing] [--create-indexes] [--migrate-halfvec] [--migrate-embeddings-text]
+                             [--migrate-ingredients-tsv]
 """
 
 import argparse
+import math
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2 import sql
 import sys
 import os
-from typing import Optional
+from typing import Dict, Optional
 
 # Add parent directory to path for imports
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -20,8 +24,24 @@ sys.path.insert(0, parent_dir)
 
 from db.connection import get_database_manager, test_db_connection
 
+# Text that gets embedded for each product, derived from the display fields.
+# Each present (non-empty) field contributes "Label: value", parts are joined by a
+# blank line; the leading separator is cut off by substr(..., 3). Only immutable
+# operators are allowed in a generated column, hence || / COALESCE instead of concat_ws.
+EMBEDDINGS_TEXT_EXPRESSION = r"""substr(
+        COALESCE(E'\n\nKey Benefits: ' || NULLIF(key_benefits, ''), '') ||
+        COALESCE(E'\n\nActive Content: ' || NULLIF(active_content, ''), '') ||
+        COALESCE(E'\n\nProduct Name: ' || NULLIF(name, ''), '') ||
+        COALESCE(E'\n\nDescription: ' || NULLIF(description, ''), '') ||
+        COALESCE(E'\n\nIngredients: ' || NULLIF(ingredients_text, ''), '') ||
+        COALESCE(E'\n\nHow to Use: ' || NULLIF(how_to_use, ''), '') ||
+        COALESCE(E'\n\nTime of Use: ' || NULLIF(time_of_use, ''), ''),
+    3)"""
+
+INGREDIENTS_TSV_EXPRESSION = "to_tsvector('simple', coalesce(ingredients_text, ''))"
+
 # SQL for creating the products table
-CREATE_PRODUCTS_TABLE = """
+CREATE_PRODUCTS_TABLE = f"""
 CREATE TABLE IF NOT EXISTS products (
     -- Core Identifier
     id SERIAL PRIMARY KEY,
@@ -32,7 +52,10 @@ CREATE TABLE IF NOT EXISTS products (
     description TEXT,
     active_content TEXT,
     ingredients_text TEXT, -- A dedicated column for the full ingredient list for allergen filtering
+    -- Token index of ingredients_text for full-text allergen filtering ('simple': no stemming or stop words)
+    ingredients_tsv TSVECTOR GENERATED ALWAYS AS ({INGREDIENTS_TSV_EXPRESSION}) STORED,
     how_to_use TEXT,
+    time_of_use TEXT,
 
     -- Data for Filtering & Business Logic
     price NUMERIC(10, 2) NOT NULL DEFAULT 0.00,
@@ -44,10 +67,12 @@ CREATE TABLE IF NOT EXISTS products (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
 
-    embeddings_text TEXT, -- Concatenated text from keyBenefits, activeContent, name, description, contents, howToUse, timeOfUse for embeddings
+    -- Concatenated text from keyBenefits, activeContent, name, description, contents, howToUse, timeOfUse for embeddings
+    embeddings_text TEXT GENERATED ALWAYS AS ({EMBEDDINGS_TEXT_EXPRESSION}) STORED,
     -- The Embedding Vector for Semantic Search
     -- Replace 384 with the dimension of your chosen embedding model.
-    embedding VECTOR(384)
+    -- Stored as half precision (pgvector >= 0.7): half the bytes per row and per HNSW node.
+    embedding HALFVEC(384)
 );
 """
 
@@ -70,7 +95,7 @@ CREATE TABLE IF NOT EXISTS concepts (
 
     -- The Embedding Vector for Semantic Search
     -- MUST be the same dimension as the products.embedding vector.
-    embedding VECTOR(384),
+    embedding HALFVEC(384),
 
     -- Unique constraint to avoid defining the same concept twice
     UNIQUE (concept_type, name)
@@ -88,7 +113,7 @@ CREATE TABLE IF NOT EXISTS users (
 
     -- The Embedding Vector for Semantic Search
     -- MUST be the same dimension as products and concepts embeddings
-    embedding VECTOR(384),
+    embedding HALFVEC(384),
 
     -- Timestamps for tracking
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
@@ -96,52 +121,217 @@ CREATE TABLE IF NOT EXISTS users (
 );
 """
 
+# Allergen search patterns (one regex per allergen, written by
+# filtering_products.allergen.allergen_filtering.refresh_unsafe_products) and
+# the products each one matches, precomputed so the exclude-unsafe filter is an
+# index probe instead of a pattern match per product and request
+CREATE_ALLERGEN_TERMS_TABLE = """
+CREATE TABLE IF NOT EXISTS allergen_terms (
+    allergen TEXT PRIMARY KEY,
+    pattern TEXT NOT NULL
+);
+"""
+
+CREATE_UNSAFE_PRODUCTS_VIEW = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS unsafe_products AS
+SELECT DISTINCT a.allergen, p.id AS product_id
+FROM allergen_terms a
+JOIN products p ON p.ingredients_text ~* a.pattern;
+"""
+
+# Unique, so the view can be refreshed CONCURRENTLY without blocking readers
+CREATE_UNSAFE_PRODUCTS_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS idx_unsafe_products_allergen_product ON unsafe_products (allergen, product_id);"
+
 # SQL for creating indexes on products table
 CREATE_PRODUCTS_INDEXES = [
-    "CREATE INDEX IF NOT EXISTS idx_products_name ON products (name);",
-    "CREATE INDEX IF NOT EXISTS idx_products_price ON products (price);",
-    "CREATE INDEX IF NOT EXISTS idx_products_stock_status ON products (stock_status);",
-    "CREATE INDEX IF NOT EXISTS idx_products_country ON products (country);",
-    "CREATE INDEX IF NOT EXISTS idx_products_created_at ON products (created_at);",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_price ON products (price);",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_stock_status ON products (stock_status);",
+    # Recommendation queries only ever look at in-stock products, optionally by country and price
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_stock_country_price ON products (stock_status, country, price) WHERE stock_status = 0;",
+    # Pre-filter for similarity-ranked analysis queries (stock and price over embedded products)
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_stock_price_embedded ON products (stock_status, price) WHERE embedding IS NOT NULL;",
+    # created_at only grows with inserts, so a BRIN summary is enough for time range scans
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_created_at_brin ON products USING BRIN (created_at) WITH (pages_per_range = 32);",
     # Index for fast text search on the full ingredients list (essential for allergen filtering)
-    "CREATE INDEX IF NOT EXISTS idx_products_ingredients_gin ON products USING GIN (to_tsvector('english', ingredients_text));",
-    # The CRITICAL index for fast vector similarity search
-    # Uses HNSW (Hierarchical Navigable Small World), the state-of-the-art for approximate nearest neighbor search.
-    # vector_cosine_ops is often preferred for semantic text similarity.
-    "CREATE INDEX IF NOT EXISTS idx_products_embedding_hnsw ON products USING HNSW (embedding vector_cosine_ops);"
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_ingredients_tsv ON products USING GIN (ingredients_tsv);",
+    # Trigram index serving the substring (ILIKE '%term%') allergen filter; needs pg_trgm
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_ingredients_trgm ON products USING GIN (ingredients_text gin_trgm_ops);",
+    # Rows still waiting for an embedding; update_embeddings.py walks this instead of scanning the table
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_missing_embedding ON products (id) WHERE embedding IS NULL AND embeddings_text IS NOT NULL;"
 ]
 
 # SQL for creating indexes on concepts table  
 CREATE_CONCEPTS_INDEXES = [
-    "CREATE INDEX IF NOT EXISTS idx_concepts_type_name ON concepts (concept_type, name);",
-    "CREATE INDEX IF NOT EXISTS idx_concepts_type ON concepts (concept_type);",
-    "CREATE INDEX IF NOT EXISTS idx_concepts_name ON concepts (name);",
-    "CREATE INDEX IF NOT EXISTS idx_concepts_created_at ON concepts (created_at);",
-    # The CRITICAL index for fast vector similarity search when mapping a query to a concept
-    "CREATE INDEX IF NOT EXISTS idx_concepts_embedding_hnsw ON concepts USING HNSW (embedding vector_cosine_ops);"
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_concepts_type_name ON concepts (concept_type, name);",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_concepts_type ON concepts (concept_type);",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_concepts_name ON concepts (name);",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_concepts_created_at_brin ON concepts USING BRIN (created_at) WITH (pages_per_range = 32);",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_concepts_missing_embedding ON concepts (id) WHERE embedding IS NULL;"
 ]
 
 # SQL for creating indexes on users table
 CREATE_USERS_INDEXES = [
-    "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at);",
-    # The CRITICAL index for fast vector similarity search for user profiles
-    "CREATE INDEX IF NOT EXISTS idx_users_embedding_hnsw ON users USING HNSW (embedding vector_cosine_ops);"
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_created_at ON users (created_at);",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_missing_embedding ON users (id) WHERE embedding IS NULL AND embedding_text IS NOT NULL;"
 ]
 
+# The CRITICAL indexes for fast vector similarity search, built after every other index.
+# Uses HNSW (Hierarchical Navigable Small World), the state-of-the-art for approximate nearest neighbor search.
+# halfvec_cosine_ops is often preferred for semantic text similarity.
+# m / ef_construction are filled in from configure_hnsw_params() at build time.
+# Partial on IS NOT NULL so it matches the predicate every similarity search uses.
+CREATE_HNSW_INDEXES = {
+    'products': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_embedding_hnsw ON products USING HNSW (embedding halfvec_cosine_ops) WITH (m = {m}, ef_construction = {ef_construction}) WHERE embedding IS NOT NULL;",
+    # Used for user profile similarity
+    'users': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_embedding_hnsw ON users USING HNSW (embedding halfvec_cosine_ops) WITH (m = {m}, ef_construction = {ef_construction}) WHERE embedding IS NOT NULL;"
+}
+
+# The concepts table holds a few dozen rows, so it gets a cheap IVFFlat index instead of HNSW,
+# and only once it is large enough for an index to beat an exact scan.
+# lists is filled in from configure_ivfflat_lists() at build time.
+CREATE_CONCEPTS_IVFFLAT_INDEX = "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_concepts_embedding_ivfflat ON concepts USING IVFFLAT (embedding halfvec_cosine_ops) WITH (lists = {lists}) WHERE embedding IS NOT NULL;"
+IVFFLAT_MIN_ROWS = 1000
+
+# Indexes no longer part of the schema; dropped to cut write amplification
+DROP_UNUSED_INDEXES = [
+    "DROP INDEX CONCURRENTLY IF EXISTS idx_products_name;",
+    "DROP INDEX CONCURRENTLY IF EXISTS idx_products_country;",
+    "DROP INDEX CONCURRENTLY IF EXISTS idx_products_created_at;",
+    # created_at btrees replaced by BRIN indexes
+    "DROP INDEX CONCURRENTLY IF EXISTS idx_concepts_created_at;",
+    # Replaced by idx_concepts_embedding_ivfflat
+    "DROP INDEX CONCURRENTLY IF EXISTS idx_concepts_embedding_hnsw;",
+    # Replaced by idx_products_ingredients_tsv on the stored ingredients_tsv column
+    "DROP INDEX CONCURRENTLY IF EXISTS idx_products_ingredients_gin;"
+]
+
+# Session settings applied while building indexes (HNSW builds are memory and CPU bound)
+INDEX_BUILD_MAINTENANCE_WORK_MEM = '2GB'
+INDEX_BUILD_PARALLEL_WORKERS = 7
+INDEX_BUILD_SETTINGS = {
+    'maintenance_work_mem': INDEX_BUILD_MAINTENANCE_WORK_MEM,
+    'max_parallel_maintenance_workers': INDEX_BUILD_PARALLEL_WORKERS,
+}
+
 # SQL for dropping tables (if needed)
 DROP_PRODUCTS_TABLE = "DROP TABLE IF EXISTS products CASCADE;"
 DROP_CONCEPTS_TABLE = "DROP TABLE IF EXISTS concepts CASCADE;"
 DROP_USERS_TABLE = "DROP TABLE IF EXISTS users CASCADE;"
 
+# SQL for migrating existing VECTOR(384) columns to HALFVEC(384).
+# Vector indexes are tied to the column's operator class, so they are dropped
+# first and rebuilt by create_indexes() afterwards.
+MIGRATE_TO_HALFVEC = [
+    "DROP INDEX IF EXISTS idx_products_embedding_hnsw;",
+    "DROP INDEX IF EXISTS idx_concepts_embedding_hnsw;",
+    "DROP INDEX IF EXISTS idx_concepts_embedding_ivfflat;",
+    "DROP INDEX IF EXISTS idx_users_embedding_hnsw;",
+    "ALTER TABLE products ALTER COLUMN embedding TYPE halfvec(384) USING embedding::halfvec(384);",
+    "ALTER TABLE concepts ALTER COLUMN embedding TYPE halfvec(384) USING embedding::halfvec(384);",
+    "ALTER TABLE users ALTER COLUMN embedding TYPE halfvec(384) USING embedding::halfvec(384);"
+]
+
+# SQL for turning an existing application-filled embeddings_text into a generated column.
+# time_of_use is new, so rows keep an empty "Time of Use" part until they are repopulated.
+MIGRATE_EMBEDDINGS_TEXT_TO_GENERATED = [
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS time_of_use TEXT;",
+    "ALTER TABLE products DROP COLUMN IF EXISTS embeddings_text;",
+    f"ALTER TABLE products ADD COLUMN embeddings_text TEXT GENERATED ALWAYS AS ({EMBEDDINGS_TEXT_EXPRESSION}) STORED;"
+]
+
+# SQL for adding the generated ingredients_tsv column to an existing products table
+MIGRATE_INGREDIENTS_TSV = [
+    f"ALTER TABLE products ADD COLUMN IF NOT EXISTS ingredients_tsv TSVECTOR GENERATED ALWAYS AS ({INGREDIENTS_TSV_EXPRESSION}) STORED;"
+]
+
+# Schema epoch: a single-row counter bumped by an event trigger after every
+# DDL command outside temporary schemas, so db.utils can cache table and index lookups until the schema
+# changes. Event triggers need superuser; without them the caches stay off.
+CREATE_SCHEMA_EPOCH = [
+    """
+    CREATE TABLE IF NOT EXISTS schema_epoch (
+        singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+        epoch BIGINT NOT NULL DEFAULT 0
+    );
+    """,
+    "INSERT INTO schema_epoch DEFAULT VALUES ON CONFLICT DO NOTHING;",
+    """
+    CREATE OR REPLACE FUNCTION bump_schema_epoch() RETURNS event_trigger
+    LANGUAGE plpgsql
+    -- Event triggers run as the role issuing the DDL; run as the owner so roles
+    -- without UPDATE on schema_epoch aren't blocked
+    SECURITY DEFINER
+    SET search_path = public, pg_temp
+    AS $$
+    BEGIN
+        -- Temp tables (e.g. update_embeddings.py's per-batch staging table) are
+        -- invisible to the cached lookups; skipping them avoids wiping the cache,
+        -- serializing sessions on the epoch row and failing in READ ONLY transactions.
+        -- DROPs report no commands here, so they always bump.
+        IF TG_TAG NOT LIKE 'DROP%' AND NOT EXISTS (
+            SELECT 1 FROM pg_event_trigger_ddl_commands()
+            WHERE schema_name IS NULL OR schema_name !~ '^pg_temp'
+        ) THEN
+            RETURN;
+        END IF;
+        
+        -- Skipped once schema_epoch itself has been dropped, so DDL keeps working
+        IF to_regclass('public.schema_epoch') IS NOT NULL THEN
+            UPDATE public.schema_epoch SET epoch = epoch + 1;
+        END IF;
+    END;
+    $$;
+    """,
+    "DROP EVENT TRIGGER IF EXISTS schema_epoch_bump;",
+    "CREATE EVENT TRIGGER schema_epoch_bump ON ddl_command_end EXECUTE FUNCTION bump_schema_epoch();"
+]
+
+
+def configure_hnsw_params(vector_count: int) -> Dict[str, int]:
+    """
+    Choose HNSW build parameters for the number of vectors being indexed.
+    
+    Larger graphs need more links per node (m) and a wider build beam
+    (ef_construction) to keep recall up; small tables keep the pgvector defaults.
+    
+    Args:
+        vector_count: Number of rows with embeddings in the table
+        
+    Returns:
+        Dictionary with 'm' and 'ef_construction' values
+    """
+    if vector_count < 100_000:
+        return {'m': 16, 'ef_construction': 64}
+    if vector_count < 1_000_000:
+        return {'m': 24, 'ef_construction': 128}
+    return {'m': 32, 'ef_construction': 200}
+
+
+def configure_ivfflat_lists(vector_count: int) -> int:
+    """
+    Choose the IVFFlat list count for the number of vectors being indexed.
+    
+    sqrt(rows) lists keeps each list small enough that a handful of probes
+    still gives near-exact recall on small tables.
+    
+    Args:
+        vector_count: Number of rows with embeddings in the table
+        
+    Returns:
+        Number of lists to build
+    """
+    return max(1, int(math.sqrt(vector_count)))
+
 
 def create_extension_if_not_exists():
-    """Create the pgvector extension if it doesn't exist."""
+    """Create the pgvector and pg_trgm extensions if they don't exist."""
     try:
         with get_database_manager().get_db_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
                 conn.commit()
-                print("✅ pgvector extension ensured")
+                print("✅ pgvector and pg_trgm extensions ensured")
                 return True
     except Exception as e:
         print(f"❌ Failed to create pgvector extension: {e}")
@@ -182,6 +372,12 @@ def create_tables():
                 cursor.execute(CREATE_USERS_TABLE)
                 print("✅ Users table created")
                 
+                # Create precomputed allergen matches (refreshed by allergen_filtering.py)
+                cursor.execute(CREATE_ALLERGEN_TERMS_TABLE)
+                cursor.execute(CREATE_UNSAFE_PRODUCTS_VIEW)
+                cursor.execute(CREATE_UNSAFE_PRODUCTS_INDEX)
+                print("✅ Allergen terms table and unsafe_products view created")
+                
                 conn.commit()
                 return True
     except Exception as e:
@@ -189,31 +385,150 @@ def create_tables():
         return False
 
 
-def create_indexes():
-    """Create indexes for performance optimization."""
+def create_schema_epoch():
+    """Create the schema epoch counter and the event trigger that bumps it."""
     try:
         with get_database_manager().get_db_connection() as conn:
             with conn.cursor() as cursor:
-                # Create indexes for products table
-                for index_sql in CREATE_PRODUCTS_INDEXES:
-                    cursor.execute(index_sql)
-                    
-                # Create indexes for concepts table
-                for index_sql in CREATE_CONCEPTS_INDEXES:
-                    cursor.execute(index_sql)
-                    
-                # Create indexes for users table
-                for index_sql in CREATE_USERS_INDEXES:
-                    cursor.execute(index_sql)
-                    
+                for epoch_sql in CREATE_SCHEMA_EPOCH:
+                    cursor.execute(epoch_sql)
                 conn.commit()
-                print("✅ All indexes created successfully")
+                print("✅ Schema epoch trigger created")
                 return True
+    except Exception as e:
+        print(f"⚠️ Could not create schema epoch trigger (schema lookups will not be cached): {e}")
+        return False
+
+
+def run_index_statement(index_sql: str):
+    """
+    Run one CREATE/DROP INDEX CONCURRENTLY on its own pooled connection.
+    
+    CONCURRENTLY cannot run inside a transaction block, so the connection is
+    switched to autocommit for the duration and the build settings are applied
+    at session level, then reset before the connection goes back to the pool.
+    
+    Args:
+        index_sql: Index statement to execute
+    """
+    with get_database_manager().get_db_connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                for setting, value in INDEX_BUILD_SETTINGS.items():
+                    cursor.execute(f"SET {setting} = %s", (value,))
+                try:
+                    cursor.execute(index_sql)
+                finally:
+                    cursor.execute("RESET ALL")
+        finally:
+            conn.autocommit = False
+
+
+def build_table_indexes(index_statements):
+    """Build one table's indexes in order (concurrent builds on a table wait on each other anyway)."""
+    for index_sql in index_statements:
+        run_index_statement(index_sql)
+
+
+def count_embedded_rows(table_name: str) -> int:
+    """Count the rows of a table that already have an embedding."""
+    with get_database_manager().get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("SELECT COUNT(*) FROM {} WHERE embedding IS NOT NULL").format(
+                sql.Identifier(table_name)))
+            return cursor.fetchone()[0]
+
+
+def create_indexes():
+    """
+    Create indexes for performance optimization without blocking writes.
+    
+    Every index is built CONCURRENTLY. Concurrent builds on the same table
+    serialize on its lock, so the btree/GIN indexes are fanned out one worker
+    per table; the vector indexes are built last, one at a time, each using the
+    parallel maintenance workers.
+    """
+    try:
+        for drop_sql in DROP_UNUSED_INDEXES:
+            run_index_statement(drop_sql)
+        
+        # Plain btree/GIN indexes first, tables in parallel
+        table_indexes = (CREATE_PRODUCTS_INDEXES, CREATE_CONCEPTS_INDEXES, CREATE_USERS_INDEXES)
+        with ThreadPoolExecutor(max_workers=len(table_indexes)) as executor:
+            futures = [executor.submit(build_table_indexes, index_statements) for index_statements in table_indexes]
+            for future in futures:
+                future.result()
+        print("✅ Btree/GIN indexes created")
+        
+        # HNSW last, once the data and every other index are in place
+        for table_name, index_sql in CREATE_HNSW_INDEXES.items():
+            # Size the HNSW graph for the vectors currently in the table
+            hnsw_params = configure_hnsw_params(count_embedded_rows(table_name))
+            print(f"📐 {table_name} HNSW parameters: m={hnsw_params['m']}, ef_construction={hnsw_params['ef_construction']}")
+            run_index_statement(index_sql.format(**hnsw_params))
+        
+        # Concepts: IVFFlat once the table outgrows an exact scan
+        concept_count = count_embedded_rows('concepts')
+        if concept_count >= IVFFLAT_MIN_ROWS:
+            lists = configure_ivfflat_lists(concept_count)
+            print(f"📐 concepts IVFFlat parameters: lists={lists}")
+            run_index_statement(CREATE_CONCEPTS_IVFFLAT_INDEX.format(lists=lists))
+        else:
+            print(f"ℹ️ concepts has {concept_count} vectors; skipping vector index (exact scan is faster)")
+        
+        print("✅ All indexes created successfully")
+        return True
     except Exception as e:
         print(f"❌ Failed to create indexes: {e}")
         return False
 
 
+def migrate_embeddings_to_halfvec():
+    """Convert existing embedding columns to halfvec(384) and drop their HNSW indexes."""
+    try:
+        with get_database_manager().get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                for migration_sql in MIGRATE_TO_HALFVEC:
+                    cursor.execute(migration_sql)
+                conn.commit()
+                print("✅ Embedding columns migrated to halfvec(384)")
+                return True
+    except Exception as e:
+        print(f"❌ Failed to migrate embedding columns: {e}")
+        return False
+
+
+def migrate_embeddings_text_to_generated():
+    """Replace products.embeddings_text with a column generated from the product fields."""
+    try:
+        with get_database_manager().get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                for migration_sql in MIGRATE_EMBEDDINGS_TEXT_TO_GENERATED:
+                    cursor.execute(migration_sql)
+                conn.commit()
+                print("✅ products.embeddings_text is now a generated column")
+                return True
+    except Exception as e:
+        print(f"❌ Failed to migrate embeddings_text: {e}")
+        return False
+
+
+def migrate_ingredients_tsv():
+    """Add the generated products.ingredients_tsv column used by full-text allergen filtering."""
+    try:
+        with get_database_manager().get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                for migration_sql in MIGRATE_INGREDIENTS_TSV:
+                    cursor.execute(migration_sql)
+                conn.commit()
+                print("✅ products.ingredients_tsv added")
+                return True
+    except Exception as e:
+        print(f"❌ Failed to add ingredients_tsv: {e}")
+        return False
+
+
 def verify_tables():
     """Verify that tables were created successfully."""
     try:
@@ -267,6 +582,12 @@ def main():
                        help='Create performance indexes after tables')
     parser.add_argument('--skip-extension', action='store_true',
                        help='Skip creating pgvector extension')
+    parser.add_argument('--migrate-halfvec', action='store_true',
+                       help='Convert existing VECTOR(384) embedding columns to HALFVEC(384) and rebuild HNSW indexes')
+    parser.add_argument('--migrate-embeddings-text', action='store_true',
+                       help='Turn products.embeddings_text into a generated column (adds time_of_use)')
+    parser.add_argument('--migrate-ingredients-tsv', action='store_true',
+                       help='Add the generated products.ingredients_tsv column and its GIN index')
     
     args = parser.parse_args()
     
@@ -294,8 +615,29 @@ def main():
         print("❌ Failed to create tables")
         return False
     
+    # Not fatal: only enables caching of schema lookups in db.utils
+    create_schema_epoch()
+    
+    # Migrate existing embedding columns if requested (indexes are rebuilt below)
+    if args.migrate_halfvec:
+        if not migrate_embeddings_to_halfvec():
+            print("❌ Failed to migrate embedding columns")
+            return False
+    
+    # Dropping embeddings_text also drops idx_products_missing_embedding (rebuilt below)
+    if args.migrate_embeddings_text:
+        if not migrate_embeddings_text_to_generated():
+            print("❌ Failed to migrate embeddings_text")
+            return False
+    
+    if args.migrate_ingredients_tsv:
+        if not migrate_ingredients_tsv():
+            print("❌ Failed to add ingredients_tsv")
+            return False
+    
     # Create indexes if requested
-    if args.create_indexes:
+    if (args.create_indexes or args.migrate_halfvec or args.migrate_embeddings_text
+            or args.migrate_ingredients_tsv):
         if not create_indexes():
             print("❌ Failed to create indexes")
             return False
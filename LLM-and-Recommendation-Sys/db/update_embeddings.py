@@ -8,17 +8,25 @@ This script:
 3. Updates the database with the embeddings
 
 Usage:
-python update_embeddings.py [--batch_size 10] [--table all|products|concepts]
+python update_embeddings.py [--batch_size 128] [--table all|products|concepts|users] [--onnx] [--embed_socket PATH] [--copy]
 
 Optional arguments:
---batch_size: Number of items to process at once (default: 10)
+--batch_size: Number of items to embed and update at once (default: 128)
 --table: Which table to update (default: all)
+--onnx: On CPU, embed with the int8-quantized ONNX model (requires optimum[onnxruntime])
+--embed_socket: Use the model kept loaded by embed_server.py on this UNIX socket, if it is running
+--copy: Write each batch with binary COPY into a staging table (fastest for large backfills)
 """
 import os
 import sys
 import argparse
-import psycopg2
+import hashlib
+import queue
+import threading
+import functools
+import io
 import numpy as np
+from psycopg2 import sql
 
 # Add the parent directory to sys.path to import local modules
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -27,179 +35,513 @@ sys.path.insert(0, parent_dir)
 # Import local modules
 import rag.core.config as config
 
+# Mini-batch size for the model's forward pass within a database batch
+EMBEDDING_BATCH_SIZE = 128
+
+# Int8 export using AVX-512 VNNI dot products, shipped in the model repo's onnx/ folder
+ONNX_QUANTIZED_MODEL_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+# Batched embedding updates, prepared once per connection; ids and embeddings
+# arrive as two parallel arrays, so the statement text never depends on the batch size
+PREPARE_UPDATE_EMBEDDINGS = {
+    "products": """
+    PREPARE update_product_embeddings (int[], halfvec[]) AS
+    UPDATE products
+    SET embedding = data.embedding
+    FROM unnest($1, $2) AS data (id, embedding)
+    WHERE products.id = data.id
+    """,
+    "concepts": """
+    PREPARE update_concept_embeddings (int[], halfvec[]) AS
+    UPDATE concepts
+    SET embedding = data.embedding
+    FROM unnest($1, $2) AS data (id, embedding)
+    WHERE concepts.id = data.id
+    """,
+    "users": """
+    PREPARE update_user_embeddings (int[], halfvec[]) AS
+    UPDATE users
+    SET embedding = data.embedding
+    FROM unnest($1, $2) AS data (id, embedding)
+    WHERE users.id = data.id
+    """
+}
+
+# Per-connection staging table for --copy; emptied before every batch so the
+# row-by-row retry path can reuse it inside one transaction
+PREPARE_EMBEDDING_STAGE = """
+CREATE TEMP TABLE IF NOT EXISTS embedding_stage (id INT, embedding HALFVEC) ON COMMIT DELETE ROWS;
+TRUNCATE embedding_stage;
+"""
+COPY_EMBEDDING_STAGE = "COPY embedding_stage (id, embedding) FROM STDIN WITH (FORMAT BINARY)"
+UPDATE_FROM_EMBEDDING_STAGE = """
+UPDATE {table} AS t
+SET embedding = s.embedding
+FROM embedding_stage AS s
+WHERE t.id = s.id
+"""
+
+# PostgreSQL binary COPY framing
+COPY_BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + (0).to_bytes(4, "big") + (0).to_bytes(4, "big")
+COPY_BINARY_TRAILER = (-1).to_bytes(2, "big", signed=True)
+
+# Batches buffered between the fetch, embed and write stages
+PIPELINE_QUEUE_SIZE = 2
+
 def parse_args():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description="Update embeddings in the database.")
-    parser.add_argument("--batch_size", type=int, default=10, help="Number of items to process at once")
+    parser.add_argument("--batch_size", type=int, default=128, help="Number of items to embed and update at once")
     parser.add_argument("--table", type=str, default="all", choices=["all", "products", "concepts", "users"],
                         help="Which table to update")
+    parser.add_argument("--onnx", action="store_true",
+                        help="On CPU, embed with the int8-quantized ONNX model (requires optimum[onnxruntime])")
+    parser.add_argument("--embed_socket", type=str, default=None,
+                        help="UNIX socket of a running embed_server.py; falls back to loading the model locally")
+    parser.add_argument("--copy", action="store_true",
+                        help="Write batches with binary COPY into a staging table and one UPDATE ... FROM")
     return parser.parse_args()
 
-def create_embeddings_model():
-    """Create and return the embedding model."""
+def create_embeddings_model(use_onnx=False):
+    """
+    Create and return the embedding model.
+    
+    Runs on the GPU in half precision when CUDA is available, otherwise on the CPU in FP32
+    (or int8 through ONNX Runtime when use_onnx is set).
+    
+    Args:
+        use_onnx: On CPU, run the int8-quantized ONNX export on ONNX Runtime's CPU provider
+            instead of eager PyTorch
+        
+    Returns:
+        HuggingFaceEmbeddings instance
+    """
+    import torch
     from langchain_community.embeddings import HuggingFaceEmbeddings
     
-    print(f"Loading embedding model: {config.SENTENCE_TRANSFORMER_MODEL_NAME}...")
+    if torch.cuda.is_available():
+        # FP16 halves memory traffic and runs on tensor cores; CPUs have no fast FP16 path
+        model_kwargs = {'device': 'cuda', 'model_kwargs': {'torch_dtype': torch.float16}}
+    elif use_onnx:
+        # Forwarded to SentenceTransformer, which handles tokenization and mean pooling
+        model_kwargs = {
+            'device': 'cpu',
+            'backend': 'onnx',
+            'model_kwargs': {'file_name': ONNX_QUANTIZED_MODEL_FILE, 'provider': 'CPUExecutionProvider'}
+        }
+    else:
+        model_kwargs = {'device': 'cpu'}
+    
+    print(f"Loading embedding model: {config.SENTENCE_TRANSFORMER_MODEL_NAME} on {model_kwargs['device']}"
+          f"{' (ONNX int8)' if model_kwargs.get('backend') == 'onnx' else ''}...")
     return HuggingFaceEmbeddings(
         model_name=config.SENTENCE_TRANSFORMER_MODEL_NAME,
-        model_kwargs={'device': 'cpu'}  # Use 'cuda' for GPU if available
+        model_kwargs=model_kwargs,
+        encode_kwargs={'batch_size': EMBEDDING_BATCH_SIZE}
     )
 
-def get_products_without_embeddings(conn, batch_size):
+class CachedEmbeddings:
+    """
+    Wrap an embedding model so identical texts are only encoded once per run.
+    
+    Texts are keyed by a 16-byte BLAKE2b digest; repeated boilerplate across
+    products, concepts and users reuses the stored float32 vector instead of
+    running another forward pass.
     """
-    Get products from the database that don't have embeddings.
+    
+    def __init__(self, embedding_model):
+        """
+        Args:
+            embedding_model: Model providing embed_documents()
+        """
+        self.embedding_model = embedding_model
+        self.cache = {}
+        self.hits = 0
+    
+    @staticmethod
+    def text_key(text):
+        """Return the cache key for a text."""
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+    
+    def embed_documents(self, texts):
+        """
+        Embed texts, encoding only those not seen before in this run.
+        
+        Args:
+            texts: List of texts to embed
+            
+        Returns:
+            List of float32 numpy embeddings in input order
+        """
+        keys = [self.text_key(text) for text in texts]
+        
+        # Unique unseen texts, first occurrence wins
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self.cache and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - len(missing)
+        
+        if missing:
+            embeddings = self.embedding_model.embed_documents(list(missing.values()))
+            for key, embedding in zip(missing, embeddings):
+                self.cache[key] = np.asarray(embedding, dtype=np.float32)
+        
+        return [self.cache[key] for key in keys]
+
+def stream_products_without_embeddings(conn, batch_size):
+    """
+    Stream products from the database that don't have embeddings, in batches.
+    
+    Uses a server-side named cursor, so the pending set is scanned once
+    instead of re-queried for every batch.
     
     Args:
         conn: PostgreSQL connection object
         batch_size: Number of products to fetch at once
         
-    Returns:
-        List of tuples (id, embeddings_text)
+    Yields:
+        Lists of tuples (id, embeddings_text)
     """
-    with conn.cursor() as cursor:
+    with conn.cursor(name="products_without_embeddings") as cursor:
+        cursor.itersize = batch_size
         cursor.execute("""
         SELECT id, embeddings_text
         FROM products
         WHERE embedding IS NULL AND embeddings_text IS NOT NULL
-        LIMIT %s
-        """, (batch_size,))
-        return cursor.fetchall()
+        ORDER BY id
+        """)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
 
-def get_concepts_without_embeddings(conn, batch_size):
+def stream_concepts_without_embeddings(conn, batch_size):
     """
-    Get concepts from the database that don't have embeddings.
+    Stream concepts from the database that don't have embeddings, in batches.
+    
+    Uses a server-side named cursor, so the pending set is scanned once
+    instead of re-queried for every batch.
     
     Args:
         conn: PostgreSQL connection object
         batch_size: Number of concepts to fetch at once
         
-    Returns:
-        List of tuples (id, description)
+    Yields:
+        Lists of tuples (id, description)
     """
-    with conn.cursor() as cursor:
+    with conn.cursor(name="concepts_without_embeddings") as cursor:
+        cursor.itersize = batch_size
         cursor.execute("""
         SELECT id, description
         FROM concepts
         WHERE embedding IS NULL
-        LIMIT %s
-        """, (batch_size,))
-        return cursor.fetchall()
+        ORDER BY id
+        """)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
 
-def get_users_without_embeddings(conn, batch_size):
+def stream_users_without_embeddings(conn, batch_size):
     """
-    Get users from the database that don't have embeddings.
+    Stream users from the database that don't have embeddings, in batches.
+    
+    Uses a server-side named cursor, so the pending set is scanned once
+    instead of re-queried for every batch.
     
     Args:
         conn: PostgreSQL connection object
         batch_size: Number of users to fetch at once
         
-    Returns:
-        List of tuples (id, embedding_text)
+    Yields:
+        Lists of tuples (id, embedding_text)
     """
-    with conn.cursor() as cursor:
+    with conn.cursor(name="users_without_embeddings") as cursor:
+        cursor.itersize = batch_size
         cursor.execute("""
         SELECT id, embedding_text
         FROM users
         WHERE embedding IS NULL AND embedding_text IS NOT NULL
-        LIMIT %s
-        """, (batch_size,))
-        return cursor.fetchall()
+        ORDER BY id
+        """)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
 
-def update_product_embedding(conn, product_id, embedding):
+def prepare_update_statements(conn, tables):
     """
-    Update the embedding for a product in the database.
+    Prepare the batched embedding UPDATE statements on a connection.
     
     Args:
         conn: PostgreSQL connection object
-        product_id: ID of the product to update
-        embedding: Vector embedding to store
+        tables: Names of the tables that will be updated in this run
     """
     with conn.cursor() as cursor:
-        # Pass the embedding as is - PostgreSQL will handle the conversion
-        cursor.execute("""
-        UPDATE products
-        SET embedding = %s::vector
-        WHERE id = %s
-        """, (embedding, product_id))
+        for table in tables:
+            cursor.execute(PREPARE_UPDATE_EMBEDDINGS[table])
 
-def update_concept_embedding(conn, concept_id, embedding):
+def update_product_embeddings(conn, product_embeddings):
     """
-    Update the embedding for a concept in the database.
+    Update the embeddings for a batch of products in one statement.
+    
+    Runs the statement prepared by prepare_update_statements().
     
     Args:
         conn: PostgreSQL connection object
-        concept_id: ID of the concept to update
-        embedding: Vector embedding to store
+        product_embeddings: List of (product_id, numpy embedding) tuples
     """
+    ids, embeddings = zip(*product_embeddings)
     with conn.cursor() as cursor:
-        # Pass the embedding as is - PostgreSQL will handle the conversion
-        cursor.execute("""
-        UPDATE concepts
-        SET embedding = %s::vector
-        WHERE id = %s
-        """, (embedding, concept_id))
+        cursor.execute("EXECUTE update_product_embeddings (%s, %s::halfvec[])", (list(ids), list(embeddings)))
 
-def update_user_embedding(conn, user_id, embedding):
+def update_concept_embeddings(conn, concept_embeddings):
     """
-    Update the embedding for a user in the database.
+    Update the embeddings for a batch of concepts in one statement.
+    
+    Runs the statement prepared by prepare_update_statements().
     
     Args:
         conn: PostgreSQL connection object
-        user_id: ID of the user to update
-        embedding: Vector embedding to store
+        concept_embeddings: List of (concept_id, numpy embedding) tuples
     """
+    ids, embeddings = zip(*concept_embeddings)
     with conn.cursor() as cursor:
-        # Pass the embedding as is - PostgreSQL will handle the conversion
-        cursor.execute("""
-        UPDATE users
-        SET embedding = %s::vector
-        WHERE id = %s
-        """, (embedding, user_id))
+        cursor.execute("EXECUTE update_concept_embeddings (%s, %s::halfvec[])", (list(ids), list(embeddings)))
 
-def update_products(conn, embedding_model, batch_size):
+def update_user_embeddings(conn, user_embeddings):
     """
-    Update product embeddings in batches.
+    Update the embeddings for a batch of users in one statement.
+    
+    Runs the statement prepared by prepare_update_statements().
     
     Args:
         conn: PostgreSQL connection object
-        embedding_model: The embedding model to use
-        batch_size: Number of products to process at once
+        user_embeddings: List of (user_id, numpy embedding) tuples
+    """
+    ids, embeddings = zip(*user_embeddings)
+    with conn.cursor() as cursor:
+        cursor.execute("EXECUTE update_user_embeddings (%s, %s::halfvec[])", (list(ids), list(embeddings)))
+
+def build_copy_buffer(embeddings_batch):
+    """
+    Encode (id, embedding) pairs as a binary COPY stream for embedding_stage.
+    
+    Every tuple has the same size, so the whole batch is laid out as one
+    numpy structured array instead of being packed row by row. halfvec's
+    binary form is a 16-bit dimension, 16 unused bits and big-endian
+    float16 values.
+    
+    Args:
+        embeddings_batch: List of (id, numpy embedding) tuples
         
     Returns:
-        Number of products updated
+        Binary file-like object for copy_expert()
     """
-    total_updated = 0
-    while True:
-        # Get batch of products without embeddings
-        products = get_products_without_embeddings(conn, batch_size)
-        if not products:
-            print("No more products without embeddings.")
-            break
+    ids, embeddings = zip(*embeddings_batch)
+    values = np.asarray(embeddings, dtype=np.float32)
+    dim = values.shape[1]
+    
+    tuple_layout = np.dtype([
+        ('field_count', '>i2'),
+        ('id_length', '>i4'), ('id', '>i4'),
+        ('embedding_length', '>i4'), ('dim', '>i2'), ('unused', '>i2'),
+        ('values', '>f2', (dim,))
+    ])
+    tuples = np.zeros(len(ids), dtype=tuple_layout)
+    tuples['field_count'] = 2
+    tuples['id_length'] = 4
+    tuples['id'] = ids
+    tuples['embedding_length'] = 4 + 2 * dim
+    tuples['dim'] = dim
+    tuples['values'] = values
+    
+    return io.BytesIO(COPY_BINARY_HEADER + tuples.tobytes() + COPY_BINARY_TRAILER)
+
+def copy_update_embeddings(conn, embeddings_batch, table):
+    """
+    Update a batch of embeddings through binary COPY and one UPDATE ... FROM.
+    
+    For large backfills this skips per-value parsing of the array parameter
+    that the prepared statements need.
+    
+    Args:
+        conn: PostgreSQL connection object
+        embeddings_batch: List of (id, numpy embedding) tuples
+        table: Name of the table to update
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(PREPARE_EMBEDDING_STAGE)
+        cursor.copy_expert(COPY_EMBEDDING_STAGE, build_copy_buffer(embeddings_batch))
+        cursor.execute(sql.SQL(UPDATE_FROM_EMBEDDING_STAGE).format(table=sql.Identifier(table)))
+
+def write_rows_individually(conn, write_batch, batch, label):
+    """
+    Re-drive a failed batch one row at a time inside a single transaction.
+    
+    Each row gets its own savepoint, so a bad row is rolled back on its own
+    and the rest of the batch is still committed together.
+    
+    Args:
+        conn: PostgreSQL connection object
+        write_batch: Function (conn, [(id, embedding), ...]) storing embeddings
+        batch: List of (id, embedding) tuples that failed as a batch
+        label: Plural table label used in progress messages
         
-        print(f"Processing batch of {len(products)} products...")
-        for i, (product_id, text) in enumerate(products, 1):
+    Returns:
+        Number of rows updated
+    """
+    updated = 0
+    with conn.cursor() as cursor:
+        for row in batch:
+            cursor.execute("SAVEPOINT embedding_row")
             try:
-                # Generate embedding
-                embedding = embedding_model.embed_query(text)
-                
-                # Convert to string format that pgvector can parse
-                embedding_str = str(embedding)
-                
-                # Update the product
-                update_product_embedding(conn, product_id, embedding_str)
-                total_updated += 1
-                print(f"Updated embedding for product {product_id} ({i}/{len(products)} in batch)")
+                write_batch(conn, [row])
+                cursor.execute("RELEASE SAVEPOINT embedding_row")
+                updated += 1
             except Exception as e:
-                print(f"Error updating embedding for product {product_id}: {e}")
-                conn.rollback()
+                cursor.execute("ROLLBACK TO SAVEPOINT embedding_row")
+                print(f"Error updating embedding for {label} ID {row[0]}: {e}")
+    conn.commit()
+    print(f"Committed {updated}/{len(batch)} {label} from the failed batch.")
+    return updated
+
+def run_embedding_pipeline(conn, embedding_model, batch_size, fetch_batches, write_batch, label):
+    """
+    Embed and store every pending row of one table with fetch, embed and write overlapped.
+    
+    A fetcher thread streams pending rows through a named cursor on its own
+    pooled connection (so commits on ``conn`` never invalidate it), the calling thread embeds each batch, and a writer thread
+    stores the results on ``conn``, so database round-trips happen while the
+    model is busy with the next batch.
+    
+    Args:
+        conn: PostgreSQL connection object used for writes
+        embedding_model: The embedding model to use
+        batch_size: Number of rows to process at once
+        fetch_batches: Generator function (conn, batch_size) yielding lists of (id, text) rows
+        write_batch: Function (conn, [(id, embedding), ...]) storing embeddings
+        label: Plural table label used in progress messages
         
-        # Commit after each batch
-        conn.commit()
-        print(f"Committed batch of {len(products)} products.")
+    Returns:
+        Number of rows updated
+    """
+    from db.connection import get_database_manager
+    
+    fetched_batches = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    embedded_batches = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stop = threading.Event()
+    total_updated = [0]
+    
+    def fetch_worker():
+        try:
+            with get_database_manager().get_db_connection() as fetch_conn:
+                for rows in fetch_batches(fetch_conn, batch_size):
+                    if stop.is_set():
+                        break
+                    fetched_batches.put(rows)
+                else:
+                    print(f"No more {label} without embeddings.")
+        except Exception as e:
+            print(f"Error fetching {label} without embeddings: {e}")
+            stop.set()
+        finally:
+            fetched_batches.put(None)
+    
+    def write_worker():
+        while True:
+            batch = embedded_batches.get()
+            if batch is None:
+                break
+            if stop.is_set():
+                continue  # Drain so the embedding loop never blocks on a full queue
+            try:
+                try:
+                    write_batch(conn, batch)
+                    conn.commit()
+                    total_updated[0] += len(batch)
+                    print(f"Committed batch of {len(batch)} {label}.")
+                except Exception as e:
+                    print(f"Error updating embeddings for {label} batch: {e}; retrying row by row")
+                    conn.rollback()
+                    total_updated[0] += write_rows_individually(conn, write_batch, batch, label)
+            except Exception as e:
+                # Stop first: rollback() itself raises on a broken connection
+                stop.set()
+                print(f"Error updating embeddings for {label}: {e}")
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+    
+    def put_for_writer(item):
+        """Queue item for the writer; False once the writer thread is gone."""
+        while writer.is_alive():
+            try:
+                embedded_batches.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    fetcher = threading.Thread(target=fetch_worker, daemon=True)
+    writer = threading.Thread(target=write_worker, daemon=True)
+    fetcher.start()
+    writer.start()
     
-    return total_updated
+    try:
+        while True:
+            rows = fetched_batches.get()
+            if rows is None:
+                break
+            if stop.is_set():
+                continue  # Drain until the fetcher notices and finishes
+            
+            print(f"Processing batch of {len(rows)} {label}...")
+            try:
+                # One forward pass for the whole batch instead of one per row
+                embeddings = embedding_model.embed_documents([text for _, text in rows])
+            except Exception as e:
+                print(f"Error generating embeddings for {label} batch: {e}")
+                stop.set()
+                continue
+            
+            # Bound through the pgvector adapter by the writer
+            if not put_for_writer([
+                (row_id, np.asarray(embedding, dtype=np.float32))
+                for (row_id, _), embedding in zip(rows, embeddings)
+            ]):
+                print(f"Writer for {label} stopped unexpectedly")
+                stop.set()
+    finally:
+        put_for_writer(None)
+        fetcher.join()
+        writer.join()
+    
+    return total_updated[0]
 
-def update_concepts(conn, embedding_model, batch_size):
+def update_products(conn, embedding_model, batch_size, use_copy=False):
+    """
+    Update product embeddings in batches.
+    
+    Args:
+        conn: PostgreSQL connection object
+        embedding_model: The embedding model to use
+        batch_size: Number of products to process at once
+        use_copy: Write batches through binary COPY instead of the prepared UPDATE
+        
+    Returns:
+        Number of products updated
+    """
+    write_batch = functools.partial(copy_update_embeddings, table="products") if use_copy else update_product_embeddings
+    return run_embedding_pipeline(conn, embedding_model, batch_size,
+                                  stream_products_without_embeddings, write_batch, "products")
+
+def update_concepts(conn, embedding_model, batch_size, use_copy=False):
     """
     Update concept embeddings in batches.
     
@@ -207,42 +549,16 @@ def update_concepts(conn, embedding_model, batch_size):
         conn: PostgreSQL connection object
         embedding_model: The embedding model to use
         batch_size: Number of concepts to process at once
+        use_copy: Write batches through binary COPY instead of the prepared UPDATE
         
     Returns:
         Number of concepts updated
     """
-    total_updated = 0
-    while True:
-        # Get batch of concepts without embeddings
-        concepts = get_concepts_without_embeddings(conn, batch_size)
-        if not concepts:
-            print("No more concepts without embeddings.")
-            break
-        
-        print(f"Processing batch of {len(concepts)} concepts...")
-        for i, (concept_id, description) in enumerate(concepts, 1):
-            try:
-                # Generate embedding
-                embedding = embedding_model.embed_query(description)
-                
-                # Convert to string format that pgvector can parse
-                embedding_str = str(embedding)
-                
-                # Update the concept
-                update_concept_embedding(conn, concept_id, embedding_str)
-                total_updated += 1
-                print(f"Updated embedding for concept {concept_id} ({i}/{len(concepts)} in batch)")
-            except Exception as e:
-                print(f"Error updating embedding for concept {concept_id}: {e}")
-                conn.rollback()
-        
-        # Commit after each batch
-        conn.commit()
-        print(f"Committed batch of {len(concepts)} concepts.")
-    
-    return total_updated
+    write_batch = functools.partial(copy_update_embeddings, table="concepts") if use_copy else update_concept_embeddings
+    return run_embedding_pipeline(conn, embedding_model, batch_size,
+                                  stream_concepts_without_embeddings, write_batch, "concepts")
 
-def update_users(conn, embedding_model, batch_size):
+def update_users(conn, embedding_model, batch_size, use_copy=False):
     """
     Update user embeddings in batches.
     
@@ -250,50 +566,38 @@ def update_users(conn, embedding_model, batch_size):
         conn: PostgreSQL connection object
         embedding_model: The embedding model to use
         batch_size: Number of users to process at once
+        use_copy: Write batches through binary COPY instead of the prepared UPDATE
         
     Returns:
         Number of users updated
     """
-    total_updated = 0
-    while True:
-        # Get batch of users without embeddings
-        users = get_users_without_embeddings(conn, batch_size)
-        if not users:
-            print("No more users without embeddings.")
-            break
-        
-        print(f"Processing batch of {len(users)} users...")
-        for i, (user_id, text) in enumerate(users, 1):
-            try:
-                # Generate embedding
-                embedding = embedding_model.embed_query(text)
-                
-                # Convert to string format that pgvector can parse
-                embedding_str = str(embedding)
-                
-                # Update the user
-                update_user_embedding(conn, user_id, embedding_str)
-                total_updated += 1
-                print(f"Updated embedding for user {user_id} ({i}/{len(users)} in batch)")
-            except Exception as e:
-                print(f"Error updating embedding for user {user_id}: {e}")
-                conn.rollback()
-        
-        # Commit after each batch
-        conn.commit()
-        print(f"Committed batch of {len(users)} users.")
-    
-    return total_updated
+    write_batch = functools.partial(copy_update_embeddings, table="users") if use_copy else update_user_embeddings
+    return run_embedding_pipeline(conn, embedding_model, batch_size,
+                                  stream_users_without_embeddings, write_batch, "users")
 
 def main():
     """Main function to update embeddings."""
     args = parse_args()
+    tables = list(PREPARE_UPDATE_EMBEDDINGS) if args.table == "all" else [args.table]
     
     # Import the new connection system
     from db.connection import get_database_manager
     
-    # Load embedding model
-    embedding_model = create_embeddings_model()
+    # Load embedding model, or reuse the one kept warm by embed_server.py
+    base_model = None
+    if args.embed_socket:
+        from db.embed_server import EmbeddingServerClient
+        client = EmbeddingServerClient(args.embed_socket)
+        if client.is_available():
+            print(f"Using embedding server at {args.embed_socket}")
+            base_model = client
+        else:
+            print(f"Embedding server not reachable at {args.embed_socket}, loading the model locally")
+    if base_model is None:
+        base_model = create_embeddings_model(args.onnx)
+    
+    # Duplicate texts across the run are embedded once
+    embedding_model = CachedEmbeddings(base_model)
     
     # Connect to PostgreSQL using new connection system
     print("Connecting to PostgreSQL...")
@@ -302,29 +606,31 @@ def main():
         concepts_updated = 0
         users_updated = 0
         
-        # Update products
-        if args.table in ["all", "products"]:
-            print("\n--- Processing Products ---")
-            with get_database_manager().get_db_connection() as conn:
-                products_updated = update_products(conn, embedding_model, args.batch_size)
+        # One connection for the whole run instead of one per table
+        with get_database_manager().get_db_connection() as conn:
+            prepare_update_statements(conn, tables)
+            
+            # Update products
+            if "products" in tables:
+                print("\n--- Processing Products ---")
+                products_updated = update_products(conn, embedding_model, args.batch_size, args.copy)
                 print(f"Total products updated with embeddings: {products_updated}")
-        
-        # Update concepts
-        if args.table in ["all", "concepts"]:
-            print("\n--- Processing Concepts ---")
-            with get_database_manager().get_db_connection() as conn:
-                concepts_updated = update_concepts(conn, embedding_model, args.batch_size)
+            
+            # Update concepts
+            if "concepts" in tables:
+                print("\n--- Processing Concepts ---")
+                concepts_updated = update_concepts(conn, embedding_model, args.batch_size, args.copy)
                 print(f"Total concepts updated with embeddings: {concepts_updated}")
-        
-        # Update users
-        if args.table in ["all", "users"]:
-            print("\n--- Processing Users ---")
-            with get_database_manager().get_db_connection() as conn:
-                users_updated = update_users(conn, embedding_model, args.batch_size)
+            
+            # Update users
+            if "users" in tables:
+                print("\n--- Processing Users ---")
+                users_updated = update_users(conn, embedding_model, args.batch_size, args.copy)
                 print(f"Total users updated with embeddings: {users_updated}")
         
-        print("\nDatabase connections closed.")
+        print("\nDatabase connection returned to the pool.")
         print(f"Summary: Updated {products_updated} products, {concepts_updated} concepts, and {users_updated} users.")
+        print(f"Reused cached embeddings for {embedding_model.hits} duplicate texts.")
     except Exception as e:
         print(f"Error connecting to PostgreSQL: {e}")
         import traceback
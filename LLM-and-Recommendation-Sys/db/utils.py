@@ -8,110 +8,371 @@ table management, and data validation.
 
 import sys
 import os
-from typing import Dict, Any, List, Optional, Tuple
+import base64
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 import json
+import threading
 from datetime import datetime
+import numpy as np
+import psycopg2
+from psycopg2 import errors, sql
+from psycopg2.extras import Json, execute_values
+
+try:
+    import orjson  # Optional: faster JSON encoding for table backups
+except ImportError:
+    orjson = None
 
 # Add parent directory to path for imports
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, parent_dir)
 
-from db.connection import get_database_manager, get_table_info
+from db.connection import get_database_manager
+
+# NOTIFY channel request_maintenance() publishes on and
+# db/maintenance_worker.py LISTENs on
+MAINTENANCE_CHANNEL = "maintenance_channel"
+
+# Rows fetched per round-trip when streaming a table backup
+BACKUP_FETCH_SIZE = 10000
+
+# Rows sent per INSERT statement when restoring a table backup
+RESTORE_BATCH_SIZE = 500
+
+# Backups store vectors as base64 of their raw float32 bytes under this key
+# instead of one JSON number per component
+BACKUP_VECTOR_KEY = "__b64_f32__"
+
+# Current schema epoch (see db.table_creation.CREATE_SCHEMA_EPOCH)
+SCHEMA_EPOCH_QUERY = "SELECT epoch FROM schema_epoch"
+
+# Table and index lookups cached for the schema epoch they were read at;
+# 'epoch_table' remembers whether schema_epoch exists (None until checked)
+_schema_cache = {'epoch': None, 'entries': {}, 'epoch_table': None}
+_schema_cache_lock = threading.Lock()
+
+# Catalog facts for a set of tables in one round-trip: planner row estimate,
+# whether the table has an embedding column and the analyzed NULL fraction of it
+TABLE_STATISTICS_QUERY = """
+    SELECT t.name,
+           c.oid IS NOT NULL AS table_exists,
+           c.reltuples::bigint AS estimated_rows,
+           EXISTS (
+               SELECT 1 FROM information_schema.columns
+               WHERE table_schema = current_schema()
+                 AND table_name = t.name
+                 AND column_name = 'embedding'
+           ) AS has_embedding,
+           s.null_frac AS embedding_null_frac
+    FROM unnest(%s::text[]) AS t(name)
+    LEFT JOIN pg_class c
+           ON c.relname = t.name AND c.relkind = 'r' AND pg_table_is_visible(c.oid)
+    LEFT JOIN pg_stats s
+           ON s.schemaname = current_schema() AND s.tablename = t.name AND s.attname = 'embedding'
+"""
+
+
+@contextmanager
+def _use_connection(conn: Optional[psycopg2.extensions.connection] = None):
+    """
+    Yield the caller's connection, or borrow one from the pool for the block.
+    
+    Lets a caller running several helpers in a row pass one connection
+    through instead of each helper checking out its own.
+    """
+    if conn is not None:
+        try:
+            yield conn
+        except Exception:
+            # Leave the caller's connection usable for its next statement
+            conn.rollback()
+            raise
+    else:
+        with get_database_manager().get_db_connection() as pooled_conn:
+            yield pooled_conn
+
+
+def get_schema_epoch(conn: psycopg2.extensions.connection) -> Optional[int]:
+    """
+    Read the current schema epoch.
+    
+    Args:
+        conn: Connection to read it on
+        
+    Returns:
+        The epoch, or None if the schema_epoch table has not been created
+    """
+    with conn.cursor() as cursor:
+        if _schema_cache['epoch_table'] is None:
+            # Checked once per process, so a cache hit costs a single statement
+            cursor.execute("SELECT to_regclass('schema_epoch') IS NOT NULL")
+            _schema_cache['epoch_table'] = cursor.fetchone()[0]
+        if not _schema_cache['epoch_table']:
+            return None
+        
+        try:
+            cursor.execute(SCHEMA_EPOCH_QUERY)
+        except errors.UndefinedTable:
+            # Dropped since it was checked: stop caching from now on
+            with _schema_cache_lock:
+                _schema_cache['epoch_table'] = False
+                _schema_cache['entries'] = {}
+            raise
+        return cursor.fetchone()[0]
 
 
-def check_table_exists(table_name: str) -> bool:
+def _cached_schema_lookup(conn: psycopg2.extensions.connection, key: Tuple, lookup):
+    """
+    Return lookup(conn), reusing the result cached for the current schema epoch.
+    
+    Any DDL bumps the epoch, which drops every cached entry. Without the
+    schema_epoch table nothing is cached. The lookup itself runs outside the
+    lock, and its result is only stored if the cache is still at the epoch it
+    was read for, so a thread behind on the epoch can't fill a newer one.
+    """
+    epoch = get_schema_epoch(conn)
+    if epoch is None:
+        return lookup(conn)
+    
+    with _schema_cache_lock:
+        if _schema_cache['epoch'] is None or epoch > _schema_cache['epoch']:
+            _schema_cache['epoch'] = epoch
+            _schema_cache['entries'] = {}
+        elif epoch == _schema_cache['epoch'] and key in _schema_cache['entries']:
+            return _schema_cache['entries'][key]
+    
+    result = lookup(conn)
+    with _schema_cache_lock:
+        if _schema_cache['epoch'] == epoch:
+            _schema_cache['entries'].setdefault(key, result)
+    return result
+
+
+def check_table_exists(table_name: str, conn: Optional[psycopg2.extensions.connection] = None) -> bool:
     """
     Check if a table exists in the database.
     
     Args:
         table_name: Name of the table to check
+        conn: Optional connection to reuse (borrowed from the pool if not provided)
         
     Returns:
         True if table exists, False otherwise
     """
+    def lookup(conn):
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT EXISTS (
+                    SELECT FROM information_schema.tables 
+                    WHERE table_schema = 'public' AND table_name = %s
+                )
+            """, (table_name,))
+            return cursor.fetchone()[0]
+    
     try:
-        table_info = get_table_info(table_name)
-        return table_info.get('exists', False)
+        with _use_connection(conn) as conn:
+            return _cached_schema_lookup(conn, ('table_exists', table_name), lookup)
     except Exception as e:
         print(f"❌ Error checking table existence: {e}")
         return False
 
 
-def get_table_row_count(table_name: str) -> int:
+def get_table_row_count(table_name: str, conn: Optional[psycopg2.extensions.connection] = None) -> int:
     """
     Get the number of rows in a table.
     
     Args:
         table_name: Name of the table
+        conn: Optional connection to reuse (borrowed from the pool if not provided)
         
     Returns:
         Number of rows, -1 if error
     """
     try:
-        with get_database_manager().get_db_connection() as conn:
+        with _use_connection(conn) as conn:
             with conn.cursor() as cursor:
-                cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+                cursor.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(sql.Identifier(table_name)))
                 return cursor.fetchone()[0]
     except Exception as e:
         print(f"❌ Error getting row count for {table_name}: {e}")
         return -1
 
 
-def get_tables_with_embeddings_status() -> Dict[str, Dict[str, int]]:
+def get_table_statistics(table_names: List[str],
+                         conn: Optional[psycopg2.extensions.connection] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Get row and embedding counts for several tables in a single catalog query.
+    
+    Counts come from the planner statistics (pg_class.reltuples and the
+    pg_stats NULL fraction of the embedding column), so they are approximate.
+    Tables that have never been analyzed fall back to one exact COUNT query.
+    
+    Args:
+        table_names: Names of the tables to inspect
+        conn: Optional connection to reuse (borrowed from the pool if not provided)
+        
+    Returns:
+        Dictionary keyed by table name with 'exists', 'row_count' and
+        'with_embeddings' (None when the table has no embedding column)
+    """
+    stats = {}
+    
+    try:
+        with _use_connection(conn) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(TABLE_STATISTICS_QUERY, (list(table_names),))
+                rows = cursor.fetchall()
+                
+                for name, exists, estimated_rows, has_embedding, null_frac in rows:
+                    if not exists:
+                        stats[name] = {'exists': False}
+                        continue
+                    
+                    if estimated_rows < 0 or (has_embedding and null_frac is None):
+                        # Never analyzed: reltuples is -1 and pg_stats has no row
+                        embedded_expr = sql.SQL("COUNT(embedding)") if has_embedding else sql.SQL("NULL")
+                        cursor.execute(sql.SQL("SELECT COUNT(*), {} FROM {}").format(
+                            embedded_expr, sql.Identifier(name)))
+                        row_count, with_embeddings = cursor.fetchone()
+                    else:
+                        row_count = estimated_rows
+                        with_embeddings = round(estimated_rows * (1 - null_frac)) if has_embedding else None
+                    
+                    stats[name] = {
+                        'exists': True,
+                        'row_count': row_count,
+                        'with_embeddings': with_embeddings
+                    }
+    except Exception as e:
+        print(f"❌ Error getting table statistics: {e}")
+    
+    return stats
+
+
+def analyze_tables(table_names: List[str], conn: Optional[psycopg2.extensions.connection] = None) -> bool:
+    """
+    Refresh planner statistics for the given tables.
+    
+    Run after bulk loads, so get_table_statistics reports the new row counts
+    instead of the estimates from before the load.
+    
+    Args:
+        table_names: Names of the tables to analyze
+        conn: Optional connection to reuse (borrowed from the pool if not provided)
+        
+    Returns:
+        True if successful, False otherwise
+    """
+    if not table_names:
+        return True
+    
+    try:
+        with _use_connection(conn) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql.SQL("ANALYZE {}").format(
+                    sql.SQL(", ").join(sql.Identifier(name) for name in table_names)))
+            conn.commit()
+            return True
+    except Exception as e:
+        print(f"❌ Error analyzing tables {', '.join(table_names)}: {e}")
+        return False
+
+
+def get_tables_with_embeddings_status(conn: Optional[psycopg2.extensions.connection] = None) -> Dict[str, Dict[str, int]]:
     """
     Get status of embedding vectors in all tables.
     
+    Args:
+        conn: Optional connection to reuse (borrowed from the pool if not provided)
+        
     Returns:
         Dictionary with table names and their embedding status
     """
     embedding_tables = ['products', 'concepts']
     status = {}
     
-    for table_name in embedding_tables:
-        if not check_table_exists(table_name):
-            status[table_name] = {'exists': False}
-            continue
-            
-        try:
-            with get_database_manager().get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    # Total rows
-                    cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-                    total = cursor.fetchone()[0]
-                    
-                    # Rows with embeddings
-                    cursor.execute(f"SELECT COUNT(*) FROM {table_name} WHERE embedding IS NOT NULL")
-                    with_embeddings = cursor.fetchone()[0]
+    try:
+        with _use_connection(conn) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT name FROM unnest(%s::text[]) AS t(name) WHERE to_regclass(name) IS NOT NULL",
+                    (embedding_tables,))
+                existing_tables = {row[0] for row in cursor.fetchall()}
+                
+                for table_name in embedding_tables:
+                    if table_name not in existing_tables:
+                        status[table_name] = {'exists': False}
+                
+                if existing_tables:
+                    # Total and embedded counts for every table in one scan each and one round-trip
+                    count_query = sql.SQL(" UNION ALL ").join(
+                        sql.SQL("SELECT {}, COUNT(*), COUNT(*) FILTER (WHERE embedding IS NOT NULL) FROM {}").format(
+                            sql.Literal(table_name), sql.Identifier(table_name))
+                        for table_name in embedding_tables if table_name in existing_tables
+                    )
+                    cursor.execute(count_query)
                     
-                    status[table_name] = {
-                        'exists': True,
-                        'total_rows': total,
-                        'with_embeddings': with_embeddings,
-                        'without_embeddings': total - with_embeddings,
-                        'completion_percentage': (with_embeddings / total * 100) if total > 0 else 0
-                    }
+                    for table_name, total, with_embeddings in cursor.fetchall():
+                        status[table_name] = {
+                            'exists': True,
+                            'total_rows': total,
+                            'with_embeddings': with_embeddings,
+                            'without_embeddings': total - with_embeddings,
+                            'completion_percentage': (with_embeddings / total * 100) if total > 0 else 0
+                        }
                     
-        except Exception as e:
-            print(f"❌ Error getting embedding status for {table_name}: {e}")
-            status[table_name] = {'exists': True, 'error': str(e)}
+    except Exception as e:
+        print(f"❌ Error getting embedding status: {e}")
+        for table_name in embedding_tables:
+            status.setdefault(table_name, {'exists': True, 'error': str(e)})
     
     return status
 
 
-def truncate_table(table_name: str) -> bool:
+def request_maintenance(payload: str) -> bool:
+    """
+    Ask db/maintenance_worker.py to run a maintenance operation in the background.
+    
+    Args:
+        payload: Maintenance request, e.g. 'vacuum_analyze' or 'truncate:products'
+        
+    Returns:
+        True if the request was sent, False otherwise
+    """
+    try:
+        with get_database_manager().get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                # Delivered to listeners when this transaction commits
+                cursor.execute("SELECT pg_notify(%s, %s)", (MAINTENANCE_CHANNEL, payload))
+                conn.commit()
+                print(f"📨 Maintenance requested: {payload}")
+                return True
+    except Exception as e:
+        print(f"❌ Error requesting maintenance {payload}: {e}")
+        return False
+
+
+def truncate_table(table_name: str, background: bool = False) -> bool:
     """
     Truncate a table (remove all rows).
     
     Args:
         table_name: Name of the table to truncate
+        background: Hand the TRUNCATE to the maintenance worker and return immediately
         
     Returns:
-        True if successful, False otherwise
+        True if successful (or requested, in background mode), False otherwise
     """
+    if background:
+        return request_maintenance(f"truncate:{table_name}")
+    
     try:
         with get_database_manager().get_db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute(f"TRUNCATE TABLE {table_name} RESTART IDENTITY CASCADE")
+                cursor.execute(sql.SQL("TRUNCATE TABLE {} RESTART IDENTITY CASCADE").format(
+                    sql.Identifier(table_name)))
                 conn.commit()
                 print(f"✅ Table {table_name} truncated successfully")
                 return True
@@ -120,6 +381,77 @@ def truncate_table(table_name: str) -> bool:
         return False
 
 
+def _backup_value(value: Any) -> Any:
+    """Convert a column value to its JSON backup form."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, np.ndarray):
+        return {BACKUP_VECTOR_KEY: base64.b64encode(value.astype(np.float32).tobytes()).decode('ascii')}
+    if hasattr(value, 'to_numpy'):  # pgvector HalfVector / Vector objects
+        return _backup_value(value.to_numpy())
+    return value
+
+
+def _restore_vector(value: Any) -> Optional[np.ndarray]:
+    """Turn a backed-up vector (base64 float32 or a plain number list) back into an array."""
+    if value is None:
+        return None
+    if isinstance(value, dict) and BACKUP_VECTOR_KEY in value:
+        return np.frombuffer(base64.b64decode(value[BACKUP_VECTOR_KEY]), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize NUMERIC columns, which neither json nor orjson handle natively."""
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode_backup_row(row_dict: Dict[str, Any]) -> bytes:
+    """Encode one backup row as compact JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(row_dict, default=_json_default)
+    return json.dumps(row_dict, ensure_ascii=False, default=_json_default).encode('utf-8')
+
+
+def _read_backup_file(f) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+    """
+    Read a backup file's header and return it with an iterator over its rows.
+    
+    backup_table_data() writes one compact JSON row per line, so rows are
+    parsed one line at a time instead of loading the whole file. Backups in
+    any other layout (e.g. the older pretty-printed format) fall back to
+    json.load and are held in memory.
+    """
+    header_lines = []
+    for line in f:
+        stripped = line.strip()
+        if stripped.startswith('"data": ['):
+            header = json.loads(''.join(header_lines) + '"data": []}')
+            if stripped != '"data": [':
+                return header, iter(())  # empty table: '"data": [],'
+            first_row = next(f, '').strip()
+            if first_row.startswith('{') and first_row.rstrip(',').endswith('}'):
+                return header, _iter_backup_rows(first_row, f)
+            break
+        header_lines.append(line)
+    
+    f.seek(0)
+    backup = json.load(f)
+    return backup, iter(backup['data'])
+
+
+def _iter_backup_rows(first_row: str, f) -> Iterator[Dict[str, Any]]:
+    """Yield the rows of a backup_table_data() file, one line at a time."""
+    yield json.loads(first_row.rstrip(','))
+    for line in f:
+        stripped = line.strip().rstrip(',')
+        if stripped == ']':
+            return
+        yield json.loads(stripped)
+
+
 def backup_table_data(table_name: str, output_file: Optional[str] = None) -> bool:
     """
     Backup table data to JSON file.
@@ -137,47 +469,128 @@ def backup_table_data(table_name: str, output_file: Optional[str] = None) -> boo
     
     try:
         with get_database_manager().get_db_connection() as conn:
+            # Embedding columns come back as numpy arrays / HalfVector objects
+            # (pgvector adapters are registered on every pooled connection)
+            # instead of '[...]' strings that would be written out verbatim
+            # Column names first, so the named cursor below only has to stream rows
             with conn.cursor() as cursor:
-                cursor.execute(f"SELECT * FROM {table_name}")
-                rows = cursor.fetchall()
-                
-                # Get column names
-                cursor.execute(f"""
+                cursor.execute("""
                     SELECT column_name FROM information_schema.columns 
-                    WHERE table_name = '{table_name}' 
+                    WHERE table_name = %s 
                     ORDER BY ordinal_position
-                """)
+                """, (table_name,))
                 columns = [row[0] for row in cursor.fetchall()]
+            
+            # Server-side cursor: rows arrive BACKUP_FETCH_SIZE at a time and are
+            # written out as they come instead of being held in one list
+            row_count = 0
+            with conn.cursor(name=f"backup_{table_name}") as cursor, \
+                    open(output_file, 'wb') as f:
+                cursor.itersize = BACKUP_FETCH_SIZE
+                cursor.execute(sql.SQL("SELECT * FROM {}").format(sql.Identifier(table_name)))
+                
+                header = (
+                    '{\n'
+                    f'  "table_name": {json.dumps(table_name)},\n'
+                    f'  "backup_timestamp": {json.dumps(datetime.now().isoformat())},\n'
+                    f'  "columns": {json.dumps(columns)},\n'
+                    '  "data": ['
+                )
+                f.write(header.encode('utf-8'))
                 
-                # Convert rows to dictionaries
-                data = []
+                for row in cursor:
+                    row_dict = {column: _backup_value(value) for column, value in zip(columns, row)}
+                    f.write(b',\n    ' if row_count else b'\n    ')
+                    f.write(_encode_backup_row(row_dict))
+                    row_count += 1
+                
+                f.write(b'\n  ],\n' if row_count else b'],\n')
+                f.write(f'  "row_count": {row_count}\n}}\n'.encode('utf-8'))
+            
+            conn.commit()
+            print(f"✅ Table {table_name} backed up to {output_file} ({row_count} rows)")
+            return True
+                
+    except Exception as e:
+        print(f"❌ Error backing up table {table_name}: {e}")
+        return False
+
+
+def restore_table_data(input_file: str, table_name: Optional[str] = None,
+                       batch_size: int = RESTORE_BATCH_SIZE) -> bool:
+    """
+    Restore a table from a JSON file written by backup_table_data().
+    
+    Rows are read back one line at a time and upserted on id in multi-row
+    INSERT batches, so memory use stays bounded by batch_size. Generated
+    columns are skipped (PostgreSQL recomputes them) and the id sequence is
+    moved past the restored ids.
+    
+    Args:
+        input_file: Backup file path
+        table_name: Table to restore into (defaults to the table named in the backup)
+        batch_size: Rows per INSERT statement
+        
+    Returns:
+        True if successful, False otherwise
+    """
+    try:
+        with open(input_file, 'r', encoding='utf-8') as f, \
+                get_database_manager().get_db_connection() as conn:
+            backup, rows = _read_backup_file(f)
+            table_name = table_name or backup['table_name']
+            
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT column_name FROM information_schema.columns
+                    WHERE table_name = %s AND is_generated = 'ALWAYS'
+                """, (table_name,))
+                generated_columns = {row[0] for row in cursor.fetchall()}
+                columns = [column for column in backup['columns'] if column not in generated_columns]
+                
+                def to_db_value(column, value):
+                    if column == 'embedding':
+                        return _restore_vector(value)
+                    if isinstance(value, (dict, list)):
+                        return Json(value)
+                    return value
+                
+                insert_query = sql.SQL("INSERT INTO {table} ({columns}) VALUES %s "
+                                       "ON CONFLICT (id) DO UPDATE SET {updates}").format(
+                    table=sql.Identifier(table_name),
+                    columns=sql.SQL(', ').join(map(sql.Identifier, columns)),
+                    updates=sql.SQL(', ').join(
+                        sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column))
+                        for column in columns if column != 'id'
+                    )
+                )
+                insert_query = insert_query.as_string(conn)
+                
+                row_count = 0
+                batch = []
                 for row in rows:
-                    row_dict = {}
-                    for i, value in enumerate(row):
-                        # Handle special data types
-                        if isinstance(value, datetime):
-                            row_dict[columns[i]] = value.isoformat()
-                        elif hasattr(value, 'tolist'):  # For numpy arrays/vectors
-                            row_dict[columns[i]] = value.tolist()
-                        else:
-                            row_dict[columns[i]] = value
-                    data.append(row_dict)
+                    batch.append(tuple(to_db_value(column, row.get(column)) for column in columns))
+                    if len(batch) >= batch_size:
+                        execute_values(cursor, insert_query, batch, page_size=batch_size)
+                        row_count += len(batch)
+                        batch = []
+                if batch:
+                    execute_values(cursor, insert_query, batch, page_size=batch_size)
+                    row_count += len(batch)
                 
-                # Write to file
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump({
-                        'table_name': table_name,
-                        'backup_timestamp': datetime.now().isoformat(),
-                        'row_count': len(data),
-                        'columns': columns,
-                        'data': data
-                    }, f, indent=2, ensure_ascii=False)
+                # Keep SERIAL ids ahead of the restored rows (no-op for tables without
+                # a sequence); is_called=false so an empty table starts again at 1
+                cursor.execute(sql.SQL(
+                    "SELECT setval(seq, (SELECT COALESCE(MAX(id), 0) + 1 FROM {}), false) "
+                    "FROM pg_get_serial_sequence(%s, 'id') AS seq WHERE seq IS NOT NULL"
+                ).format(sql.Identifier(table_name)), (table_name,))
                 
-                print(f"✅ Table {table_name} backed up to {output_file} ({len(data)} rows)")
+                conn.commit()
+                print(f"✅ Table {table_name} restored from {input_file} ({row_count} rows)")
                 return True
                 
     except Exception as e:
-        print(f"❌ Error backing up table {table_name}: {e}")
+        print(f"❌ Error restoring table from {input_file}: {e}")
         return False
 
 
@@ -191,24 +604,42 @@ def get_database_schema_summary() -> Dict[str, Any]:
     try:
         with get_database_manager().get_db_connection() as conn:
             with conn.cursor() as cursor:
-                # Get all tables
+                # All tables and their columns in one catalog query
                 cursor.execute("""
-                    SELECT table_name FROM information_schema.tables 
-                    WHERE table_schema = 'public' AND table_type = 'BASE TABLE'
-                    ORDER BY table_name
+                    SELECT t.table_name, c.column_name, c.data_type, c.is_nullable, c.column_default
+                    FROM information_schema.tables t
+                    LEFT JOIN information_schema.columns c
+                           ON c.table_schema = t.table_schema AND c.table_name = t.table_name
+                    WHERE t.table_schema = 'public' AND t.table_type = 'BASE TABLE'
+                    ORDER BY t.table_name, c.ordinal_position
                 """)
-                tables = [row[0] for row in cursor.fetchall()]
+                
+                tables = {}
+                for table_name, column_name, data_type, is_nullable, column_default in cursor.fetchall():
+                    table_info = tables.setdefault(table_name, {'exists': True, 'columns': [], 'row_count': None})
+                    if column_name is not None:
+                        table_info['columns'].append({
+                            'column_name': column_name,
+                            'data_type': data_type,
+                            'is_nullable': is_nullable,
+                            'column_default': column_default
+                        })
+                
+                # Row counts for every table in a single round-trip
+                if tables:
+                    cursor.execute(sql.SQL(" UNION ALL ").join(
+                        sql.SQL("SELECT {}, COUNT(*) FROM {}").format(sql.Literal(table_name), sql.Identifier(table_name))
+                        for table_name in tables
+                    ))
+                    for table_name, row_count in cursor.fetchall():
+                        tables[table_name]['row_count'] = row_count
                 
                 schema_info = {
                     'database_name': conn.get_dsn_parameters()['dbname'],
-                    'tables': {},
+                    'tables': tables,
                     'total_tables': len(tables)
                 }
                 
-                for table_name in tables:
-                    table_info = get_table_info(table_name)
-                    schema_info['tables'][table_name] = table_info
-                
                 return schema_info
                 
     except Exception as e:
@@ -216,13 +647,19 @@ def get_database_schema_summary() -> Dict[str, Any]:
         return {'error': str(e)}
 
 
-def optimize_database() -> bool:
+def optimize_database(background: bool = False) -> bool:
     """
     Optimize database by running VACUUM and ANALYZE.
     
+    Args:
+        background: Hand the VACUUM (ANALYZE) to the maintenance worker and return immediately
+        
     Returns:
-        True if successful, False otherwise
+        True if successful (or requested, in background mode), False otherwise
     """
+    if background:
+        return request_maintenance("vacuum_analyze")
+    
     try:
         with get_database_manager().get_db_connection() as conn:
             # Set autocommit for VACUUM
@@ -247,93 +684,151 @@ def optimize_database() -> bool:
             conn.autocommit = False
 
 
-def check_indexes_status(table_name: str) -> Dict[str, Any]:
+def check_indexes_status(table_name: str, conn: Optional[psycopg2.extensions.connection] = None) -> Dict[str, Any]:
     """
     Check the status of indexes for a table.
     
     Args:
         table_name: Name of the table
+        conn: Optional connection to reuse (borrowed from the pool if not provided)
         
     Returns:
         Dictionary with index information
     """
+    def lookup(conn):
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT indexname, indexdef 
+                FROM pg_indexes 
+                WHERE tablename = %s
+                ORDER BY indexname
+            """, (table_name,))
+            
+            indexes = cursor.fetchall()
+            
+            return {
+                'table_name': table_name,
+                'index_count': len(indexes),
+                'indexes': [
+                    {'name': idx[0], 'definition': idx[1]} 
+                    for idx in indexes
+                ]
+            }
+    
     try:
-        with get_database_manager().get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT indexname, indexdef 
-                    FROM pg_indexes 
-                    WHERE tablename = %s
-                    ORDER BY indexname
-                """, (table_name,))
-                
-                indexes = cursor.fetchall()
-                
-                return {
-                    'table_name': table_name,
-                    'index_count': len(indexes),
-                    'indexes': [
-                        {'name': idx[0], 'definition': idx[1]} 
-                        for idx in indexes
-                    ]
-                }
-                
+        with _use_connection(conn) as conn:
+            return _cached_schema_lookup(conn, ('indexes', table_name), lookup)
+            
     except Exception as e:
         print(f"❌ Error checking indexes for {table_name}: {e}")
         return {'error': str(e)}
 
 
-def validate_vector_dimensions(table_name: str, expected_dim: int = 384) -> Dict[str, Any]:
+def validate_vector_dimensions(table_name: str, expected_dim: int = 384,
+                               conn: Optional[psycopg2.extensions.connection] = None) -> Dict[str, Any]:
     """
     Validate vector dimensions in embedding columns.
     
     Args:
         table_name: Name of the table
         expected_dim: Expected vector dimension
+        conn: Optional connection to reuse (borrowed from the pool if not provided)
         
     Returns:
         Dictionary with validation results
     """
     try:
-        with get_database_manager().get_db_connection() as conn:
+        with _use_connection(conn) as conn:
             with conn.cursor() as cursor:
                 # Check if embedding column exists
-                cursor.execute(f"""
+                cursor.execute("""
                     SELECT column_name, data_type 
                     FROM information_schema.columns 
-                    WHERE table_name = '{table_name}' AND column_name = 'embedding'
-                """)
+                    WHERE table_name = %s AND column_name = 'embedding'
+                """, (table_name,))
                 
                 embedding_column = cursor.fetchone()
                 if not embedding_column:
                     return {'error': 'No embedding column found'}
                 
-                # Check vector dimensions
-                cursor.execute(f"""
-                    SELECT id, array_length(embedding, 1) as dim_size
-                    FROM {table_name} 
+                # Dimension histogram over every embedded row, computed server-side
+                # so no vectors are transferred
+                cursor.execute(sql.SQL("""
+                    SELECT vector_dims(embedding) AS dim_size, COUNT(*)
+                    FROM {}
                     WHERE embedding IS NOT NULL
-                    LIMIT 10
-                """)
-                
-                samples = cursor.fetchall()
+                    GROUP BY 1
+                """).format(sql.Identifier(table_name)))
                 
-                # Analyze dimensions
-                dimension_counts = {}
-                for sample_id, dim_size in samples:
-                    if dim_size not in dimension_counts:
-                        dimension_counts[dim_size] = 0
-                    dimension_counts[dim_size] += 1
+                dimension_counts = dict(cursor.fetchall())
                 
                 return {
                     'table_name': table_name,
                     'embedding_column_exists': True,
                     'expected_dimension': expected_dim,
                     'dimension_distribution': dimension_counts,
-                    'samples_checked': len(samples),
-                    'all_correct_dimension': all(dim == expected_dim for _, dim in samples) if samples else None
+                    'min_dimension': min(dimension_counts) if dimension_counts else None,
+                    'max_dimension': max(dimension_counts) if dimension_counts else None,
+                    'samples_checked': sum(dimension_counts.values()),
+                    'all_correct_dimension': set(dimension_counts) == {expected_dim} if dimension_counts else None
                 }
                 
     except Exception as e:
         print(f"❌ Error validating vector dimensions for {table_name}: {e}")
-        return {'error': str(e)}
\ No newline at end of file
+        return {'error': str(e)}
+
+
+def to_vector_array(value: Any) -> Optional[np.ndarray]:
+    """
+    Convert a vector column value to a float32 array.
+    
+    Accepts what pooled connections decode vectors to (numpy arrays and
+    pgvector HalfVector objects) as well as '[...]' text literals.
+    
+    Args:
+        value: Vector column value
+        
+    Returns:
+        1-D float32 numpy array, or None if value is not a vector
+    """
+    if value is None:
+        return None
+    if hasattr(value, 'to_numpy'):  # pgvector HalfVector / Vector objects
+        value = value.to_numpy()
+    if isinstance(value, np.ndarray):
+        return value.astype(np.float32, copy=False)
+    
+    vector_text = str(value).strip()
+    if vector_text.startswith('[') and vector_text.endswith(']'):
+        return parse_vector_literal(vector_text)
+    return None
+
+
+def parse_vector_literal(vector_text: str) -> np.ndarray:
+    """
+    Parse a pgvector text literal such as '[0.1,0.2,...]' into a float32 array.
+    
+    Args:
+        vector_text: Vector as returned by PostgreSQL without a registered adapter
+        
+    Returns:
+        1-D float32 numpy array
+    """
+    return np.fromstring(vector_text.strip()[1:-1], sep=',', dtype=np.float32)
+
+
+def format_vector_literal(embedding) -> str:
+    """
+    Format an embedding as a pgvector text literal for a '%s::halfvec' parameter.
+    
+    Formats all components in one numpy call with 6 significant digits (more
+    than halfvec stores), which is faster and shorter than str() of a list.
+    
+    Args:
+        embedding: Sequence or numpy array of floats
+        
+    Returns:
+        Vector literal such as '[0.1,0.2,...]'
+    """
+    values = np.asarray(embedding, dtype=np.float32)
+    return '[' + ','.join(np.char.mod('%.6g', values)) + ']'
@@ -11,21 +11,32 @@ sys.path.insert(0, parent_dir)
 
 from db.connection import get_database_manager
 
+# First products by ID and the ID statistics in one round-trip. The statistics
+# are joined on (rather than computed as window functions over the LIMITed
+# scan), so the first 10 rows still come straight from the primary key index
+# and an empty table still yields its statistics row.
+VERIFY_PRODUCT_IDS_QUERY = """
+SELECT stats.min_id, stats.max_id, stats.product_count, p.id, p.name
+FROM (SELECT MIN(id) AS min_id, MAX(id) AS max_id, COUNT(*) AS product_count FROM products) stats
+LEFT JOIN LATERAL (SELECT id, name FROM products ORDER BY id LIMIT 10) p ON true
+ORDER BY p.id
+"""
+
 def verify_product_ids():
     """Check if the products in the database use the original IDs from JSON."""
     try:
         with get_database_manager().get_db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute('SELECT id, name FROM products ORDER BY id LIMIT 10')
+                cursor.execute(VERIFY_PRODUCT_IDS_QUERY)
                 rows = cursor.fetchall()
                 print('First 10 products with their IDs:')
                 print('-' * 50)
                 for row in rows:
-                    print(f'ID: {row[0]:3d}, Name: {row[1]}')
+                    if row[3] is not None:
+                        print(f'ID: {row[3]:3d}, Name: {row[4]}')
                 
                 # Check if IDs match expected pattern (103, 104, etc. from JSON)
-                cursor.execute('SELECT MIN(id), MAX(id), COUNT(*) FROM products')
-                min_id, max_id, count = cursor.fetchone()
+                min_id, max_id, count = rows[0][:3]
                 print(f'\nID Statistics:')
                 print(f'Minimum ID: {min_id}')
                 print(f'Maximum ID: {max_id}')
@@ -10,22 +10,244 @@ This module provides comprehensive allergen filtering functionality:
 
 Usage:
 python allergen_filtering.py --user_id 2 [--dry_run] [--verbose]
+python allergen_filtering.py --user_ids 1,2,3
+python allergen_filtering.py --refresh_unsafe_products   (e.g. nightly from cron)
 """
 
 import os
 import sys
 import argparse
 import json
-from typing import List, Dict, Set, Tuple, Optional
+import re
+import time
+import functools
+import logging
+import threading
+from types import MappingProxyType
+from typing import Callable, List, Dict, Mapping, Set, Tuple, Optional, Union
 
 # Add parent directory to path for imports
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, parent_dir)
 
-from utility.get_preference import get_preference
+from utility.get_preference import get_preference, get_preferences
 from mapping import AllergenicIngredients
 from filtering_products.allergen.allergen_detector import default_detector
 from db.connection import get_database_manager
+from psycopg2.extras import execute_values
+
+try:
+    import ahocorasick  # pyahocorasick: one pass per text for all search terms
+except ImportError:
+    ahocorasick = None
+
+# Allergen preferences change rarely, so API lookups are reused for this many seconds
+USER_ALLERGEN_CACHE_TTL = 300
+USER_ALLERGEN_CACHE_SIZE = 10000
+
+# Below this many search terms plain substring checks beat building and walking an automaton
+AHOCORASICK_MIN_TERMS = 8
+AUTOMATON_CACHE_SIZE = 256
+
+# Rewrite the allergen patterns and recompute the products they match
+DELETE_ALLERGEN_TERMS = "DELETE FROM allergen_terms"
+INSERT_ALLERGEN_TERMS = "INSERT INTO allergen_terms (allergen, pattern) VALUES %s"
+REFRESH_UNSAFE_PRODUCTS = "REFRESH MATERIALIZED VIEW CONCURRENTLY unsafe_products"
+
+# Rows per round-trip when streaming test query results
+TEST_QUERY_FETCH_SIZE = 100
+
+
+def build_allergen_pattern(search_terms: List[str]) -> str:
+    """
+    Build a PostgreSQL regex matching any of the search terms as a substring.
+    
+    Args:
+        search_terms: Lowercase allergen search terms (see generate_search_terms)
+        
+    Returns:
+        Alternation of the escaped terms (for use with ~*)
+    """
+    # re.escape only backslashes punctuation, which PostgreSQL regexes also read as literal
+    return "|".join(dict.fromkeys(re.escape(term) for term in search_terms))
+
+
+@functools.lru_cache(maxsize=1024)
+def _search_terms_for_allergen(allergen_name: str) -> Tuple[str, ...]:
+    """
+    Search terms for one allergen; the detector's answer never changes, so it is computed once.
+    
+    Terms are lowercased and interned here, so matching code never lowercases
+    a term again and equal terms share one string.
+    """
+    return tuple(dict.fromkeys(
+        sys.intern(term.lower()) for term in default_detector.generate_search_terms(allergen_name)
+    ))
+
+
+def _fulltext_query(search_terms: Tuple[str, ...]) -> str:
+    """
+    Build a single tsquery matching any of the search terms.
+    
+    Multi-word terms become phrase matches ("tea <-> tree"); the terms are
+    OR-ed, so the whole filter is one parameter and one GIN index probe.
+    The last word is a prefix match (":*"), so "paraben" still catches
+    "parabens" and "nickel" catches "nickelous"; GIN serves prefixes too.
+    
+    Returns:
+        The tsquery text, or "" if no term has a searchable word
+    """
+    phrases = []
+    for term in search_terms:
+        words = re.findall(r"[a-z0-9]+", term)
+        if words:
+            phrases.append("(" + " <-> ".join(words) + ":*)")
+    return " | ".join(dict.fromkeys(phrases))
+
+
+@functools.lru_cache(maxsize=256)
+def _allergen_filter_components(
+    search_terms: Tuple[str, ...],
+    exclude_unsafe: bool,
+    use_fulltext: Union[bool, str]
+) -> Tuple[str, Tuple[str, ...]]:
+    """
+    Build the allergen WHERE snippet and parameters for a set of search terms.
+    
+    Cached, since the same allergen set (and so the same terms) comes back
+    on every request of a user.
+    
+    Args:
+        search_terms: Flat tuple of allergen search terms
+        exclude_unsafe: Whether to exclude (True) or select (False) matching products
+        use_fulltext: True to match words against ingredients_tsv instead of
+                      substrings (terms with punctuation still match as
+                      substrings), "auto" to do so only for single-word terms
+        
+    Returns:
+        Tuple of (where_clause_snippet, parameters); an empty snippet if no term is usable
+    """
+    if use_fulltext == "auto":
+        word_terms = tuple(term for term in search_terms if re.fullmatch(r"[a-z]+", term))
+        substring_terms = tuple(term for term in search_terms if term not in word_terms)
+    elif use_fulltext:
+        # The text parser indexes hyphenated compounds ("4-hydroxybenzoate") as
+        # a whole word followed by their parts, so phrases built from such terms
+        # never line up; anything but words and spaces stays a substring match
+        word_terms = tuple(term for term in search_terms if re.fullmatch(r"[a-z0-9 ]+", term))
+        substring_terms = tuple(term for term in search_terms if term not in word_terms)
+    else:
+        word_terms, substring_terms = (), search_terms
+    
+    conditions = []
+    parameters = []
+    
+    tsquery = _fulltext_query(word_terms) if word_terms else ""
+    if tsquery:
+        condition = "ingredients_tsv @@ to_tsquery('simple', %s)"
+        conditions.append(f"NOT ({condition})" if exclude_unsafe else condition)
+        parameters.append(tsquery)
+    
+    if substring_terms:
+        # One case-insensitive regex alternation matches any search term as a
+        # substring, same as the former ILIKE '%term%' OR-chain, but as a single
+        # parameter and one pass per row. idx_products_ingredients_trgm serves it.
+        condition = "ingredients_text ~* %s"
+        
+        # Apply NOT if we want to exclude unsafe products. Kept as a per-row
+        # predicate: it only runs on the rows the rest of the query produces
+        # (e.g. HNSW candidates), and, as before, drops NULL ingredient lists.
+        conditions.append(f"NOT ({condition})" if exclude_unsafe else condition)
+        parameters.append(build_allergen_pattern(list(substring_terms)))
+    
+    if len(conditions) > 1:
+        # Safe only if neither part matches; unsafe if either does
+        where_clause = " AND ".join(conditions) if exclude_unsafe else f"({' OR '.join(conditions)})"
+    else:
+        where_clause = "".join(conditions)
+    
+    return where_clause, tuple(parameters)
+
+
+@functools.lru_cache(maxsize=256)
+def _allergen_summary(allergen_terms: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> Mapping:
+    """
+    Summary of one allergen configuration, built once per configuration.
+    
+    Read-only, since the same object is handed to every caller.
+    """
+    search_terms_by_allergen = dict(allergen_terms)
+    return MappingProxyType({
+        'allergen_count': len(search_terms_by_allergen),
+        'allergens': tuple(search_terms_by_allergen),
+        'total_search_terms': sum(len(terms) for terms in search_terms_by_allergen.values()),
+        'search_terms_by_allergen': MappingProxyType(search_terms_by_allergen)
+    })
+
+
+def refresh_unsafe_products() -> bool:
+    """
+    Recompute the unsafe_products materialized view.
+    
+    Writes one regex per known allergen (every AllergenicIngredients name)
+    into allergen_terms and refreshes the view. Run it after products or the
+    allergen detector change; readers are not blocked while it refreshes.
+    
+    Returns:
+        True if successful, False otherwise
+    """
+    rows = [
+        (allergen, build_allergen_pattern(terms))
+        for allergen in dict.fromkeys(AllergenicIngredients.values())
+        for terms in [_search_terms_for_allergen(allergen)]
+        if terms
+    ]
+    
+    try:
+        with get_database_manager().get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(DELETE_ALLERGEN_TERMS)
+                execute_values(cursor, INSERT_ALLERGEN_TERMS, rows)
+                cursor.execute(REFRESH_UNSAFE_PRODUCTS)
+                conn.commit()
+                print(f"✅ unsafe_products refreshed for {len(rows)} allergens")
+                return True
+    except Exception as e:
+        print(f"❌ Failed to refresh unsafe_products: {e}")
+        return False
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_detector(allergen_terms: Tuple[Tuple[str, Tuple[str, ...]], ...]):
+    """
+    Generate a detector function specialised to one allergen configuration.
+    
+    The body is a straight run of `'term' in text` checks against constant
+    strings, so per-product detection skips the dict and list iteration of
+    the generic loop. Cached, since a user's configuration recurs for every
+    product analysed.
+    
+    Args:
+        allergen_terms: (allergen, lowercase terms) pairs in detection order
+        
+    Returns:
+        Function mapping lowercased text -> detected allergen names, or None
+        if it could not be compiled
+    """
+    lines = ["def detect(text):", "    detected = []"]
+    for allergen, terms in allergen_terms:
+        if terms:
+            condition = " or ".join(f"{term!r} in text" for term in terms)
+            lines.append(f"    if {condition}:")
+            lines.append(f"        detected.append({allergen!r})")
+    lines.append("    return detected")
+    
+    namespace = {}
+    try:
+        exec(compile("\n".join(lines), "<allergen detector>", "exec"), namespace)
+    except (SyntaxError, RecursionError, MemoryError):
+        return None
+    return namespace["detect"]
 
 
 class AllergenFilter:
@@ -37,43 +259,120 @@ class AllergenFilter:
     other modules (like AnalysisModule) to build comprehensive queries.
     """
     
+    # Shared by every instance: user_id -> (expires_at, allergen_names, preferences)
+    _user_allergen_cache = {}
+    
+    # Shared by every instance: frozenset of (term, allergen) pairs -> automaton
+    _automaton_cache = {}
+    
+    # Guards eviction and insertion in both caches; instances are used from
+    # thread pools (analyze_products_for_users, get_preferences)
+    _cache_lock = threading.Lock()
+    
     def __init__(self):
         self.detector = default_detector
         self.allergen_mapping = AllergenicIngredients
+        self.logger = logging.getLogger(__name__)
+    
+    @classmethod
+    def invalidate_user_allergens(cls, user_id: Optional[int] = None):
+        """
+        Drop cached allergen preferences, e.g. after a user updates them.
+        
+        Args:
+            user_id: User to forget, or None to clear the whole cache
+        """
+        with cls._cache_lock:
+            if user_id is None:
+                cls._user_allergen_cache.clear()
+            else:
+                cls._user_allergen_cache.pop(user_id, None)
         
     def get_user_allergens(self, user_id: int) -> Tuple[List[str], Dict]:
         """
         Fetch user preferences and extract allergen names.
         
+        Results are cached per user for USER_ALLERGEN_CACHE_TTL seconds, so
+        repeated analyses for the same user do not call the preferences API again.
+        
         Args:
             user_id: User ID to fetch preferences for
             
         Returns:
             Tuple of (allergen_names_list, full_preferences_dict)
         """
-        print(f"📡 Fetching preferences for user {user_id}...")
+        cached = self._user_allergen_cache.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            return list(cached[1]), cached[2]
+        
+        self.logger.debug("Fetching preferences for user %s", user_id)
         
         # Get user preferences from API
         preferences = get_preference(user_id)
         if not preferences:
-            print(f"❌ Failed to fetch preferences for user {user_id}")
+            self.logger.warning("Failed to fetch preferences for user %s", user_id)
             return [], {}
         
+        return self._cache_user_allergens(user_id, preferences), preferences
+    
+    def get_user_allergens_bulk(self, user_ids: List[int]) -> Dict[int, List[str]]:
+        """
+        Fetch allergen names for many users at once.
+        
+        Users with cached preferences are answered from the cache; the rest are
+        fetched concurrently over one pooled HTTP session and cached, so later
+        get_user_allergens() calls for them do not hit the API.
+        
+        Args:
+            user_ids: User IDs to fetch preferences for
+            
+        Returns:
+            Dictionary mapping user_id -> allergen_names_list
+        """
+        now = time.monotonic()
+        allergens_by_user = {}
+        missing = []
+        for user_id in user_ids:
+            cached = self._user_allergen_cache.get(user_id)
+            if cached and cached[0] > now:
+                allergens_by_user[user_id] = list(cached[1])
+            else:
+                missing.append(user_id)
+        
+        if missing:
+            self.logger.debug("Fetching preferences for %s user(s)", len(missing))
+            for user_id, preferences in get_preferences(missing).items():
+                if preferences:
+                    allergens_by_user[user_id] = self._cache_user_allergens(user_id, preferences)
+                else:
+                    self.logger.warning("Failed to fetch preferences for user %s", user_id)
+                    allergens_by_user[user_id] = []
+        
+        return allergens_by_user
+    
+    def _cache_user_allergens(self, user_id: int, preferences: Dict) -> List[str]:
+        """Map a user's preferences to allergen names and cache both"""
         # Extract allergenic ingredients
         allergen_ids = preferences.get('allergenicIngredients', [])
-        print(f"🧪 Found {len(allergen_ids)} allergen ID(s): {allergen_ids}")
+        self.logger.debug("Found %s allergen ID(s) for user %s: %s", len(allergen_ids), user_id, allergen_ids)
         
         # Map IDs to names
         allergen_names = []
         for allergen_id in allergen_ids:
-            if allergen_id in self.allergen_mapping:
-                allergen_name = self.allergen_mapping[allergen_id]
+            allergen_name = self.allergen_mapping.get(allergen_id)
+            if allergen_name:
                 allergen_names.append(allergen_name)
-                print(f"   ID {allergen_id} → {allergen_name}")
+                self.logger.debug("   ID %s → %s", allergen_id, allergen_name)
             else:
-                print(f"⚠️  Unknown allergen ID: {allergen_id}")
+                self.logger.warning("Unknown allergen ID: %s", allergen_id)
+        
+        cache = self._user_allergen_cache
+        with self._cache_lock:
+            if user_id not in cache and len(cache) >= USER_ALLERGEN_CACHE_SIZE:
+                cache.pop(next(iter(cache)))  # Evict the oldest entry
+            cache[user_id] = (time.monotonic() + USER_ALLERGEN_CACHE_TTL, tuple(allergen_names), preferences)
         
-        return allergen_names, preferences
+        return allergen_names
     
     def generate_search_terms(self, allergen_names: List[str]) -> Dict[str, List[str]]:
         """
@@ -83,22 +382,24 @@ class AllergenFilter:
             allergen_names: List of allergen names
             
         Returns:
-            Dictionary mapping allergen_name -> search_terms_list
+            Dictionary mapping allergen_name -> search_terms_list (lowercase)
         """
-        print(f"🔍 Generating search terms for {len(allergen_names)} allergen(s)...")
-        
         search_terms_map = {}
         for allergen in allergen_names:
-            terms = self.detector.generate_search_terms(allergen)
-            search_terms_map[allergen] = terms
-            print(f"   {allergen}: {terms}")
+            search_terms_map[allergen] = list(_search_terms_for_allergen(allergen))
+        
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Generated search terms for %s allergen(s)", len(allergen_names))
+            for allergen, terms in search_terms_map.items():
+                self.logger.debug("   %s: %s", allergen, terms)
         
         return search_terms_map
     
     def generate_allergen_filter_sql(
         self, 
         allergen_search_terms: Dict[str, List[str]],
-        exclude_unsafe: bool = True
+        exclude_unsafe: bool = True,
+        use_fulltext: Union[bool, str] = False
     ) -> Tuple[str, List[str]]:
         """
         Generate SQL WHERE clause components for allergen filtering.
@@ -107,16 +408,23 @@ class AllergenFilter:
             allergen_search_terms: Dictionary mapping allergen -> search terms
             exclude_unsafe: If True, generates filter to exclude products with allergens.
                            If False, generates filter to include only products with allergens.
+            use_fulltext: Match word prefixes against the GIN-indexed products.ingredients_tsv
+                          column instead of substrings. Index-backed, but a term no longer
+                          matches inside a longer word ("paraben" vs "methylparaben").
+                          Terms with punctuation ("methyl 4-hydroxybenzoate") always
+                          match as substrings.
+                          "auto" does this only for single-word terms and keeps
+                          substring matching for the rest.
             
         Returns:
             Tuple of (where_clause_snippet, parameters_list)
             
         Example:
-            where_clause = "NOT (ingredients_text ILIKE %s OR ingredients_text ILIKE %s)"
-            parameters = ["%nickel%", "%parabens%"]
+            where_clause = "NOT (ingredients_text ~* %s)"
+            parameters = ["nickel|parabens"]
         """
         if not allergen_search_terms:
-            print("⚠️  No allergen search terms provided, returning empty filter")
+            self.logger.debug("No allergen search terms provided, returning empty filter")
             return "", []
         
         # Collect all search terms from all allergens
@@ -125,35 +433,68 @@ class AllergenFilter:
             all_search_terms.extend(terms)
         
         if not all_search_terms:
-            print("⚠️  No search terms generated, returning empty filter")
+            self.logger.debug("No search terms generated, returning empty filter")
             return "", []
         
-        print(f"🔍 Generating SQL filter for {len(all_search_terms)} allergen search terms...")
+
+        where_clause, parameters = _allergen_filter_components(tuple(all_search_terms), exclude_unsafe, use_fulltext)
         
-        # Create ILIKE conditions for each search term
-        ilike_conditions = []
-        parameters = []
+        if not where_clause:
+            self.logger.debug("No searchable words in allergen terms, returning empty filter")
+            return "", []
         
-        for term in all_search_terms:
-            ilike_conditions.append("ingredients_text ILIKE %s")
-            parameters.append(f"%{term}%")
+        self.logger.debug(
+            "Generated %s allergen filter (%s): %s terms in %s parameter(s)",
+            {True: "full-text", "auto": "mixed"}.get(use_fulltext, "substring"),
+            "exclude unsafe" if exclude_unsafe else "include unsafe only",
+            len(all_search_terms),
+            len(parameters)
+        )
         
-        # Combine all conditions with OR (any allergen match)
-        combined_condition = f"({' OR '.join(ilike_conditions)})"
+        return where_clause, list(parameters)
+    
+    def generate_precomputed_allergen_filter_sql(
+        self,
+        allergen_names: List[str],
+        exclude_unsafe: bool = True,
+        product_id_column: str = "id"
+    ) -> Tuple[str, List]:
+        """
+        Generate the allergen filter against the precomputed unsafe_products view.
         
-        # Apply NOT if we want to exclude unsafe products
-        if exclude_unsafe:
-            where_clause = f"NOT {combined_condition}"
-            filter_type = "exclude unsafe"
-        else:
-            where_clause = combined_condition
-            filter_type = "include unsafe only"
+        One parameter however many terms the allergens have, and no pattern
+        matching at query time. Results are as fresh as the last
+        refresh_unsafe_products() run: products added since then are treated
+        as safe. As with the live filter, excluding also drops products with
+        no ingredient list.
         
-        print(f"✅ Generated allergen filter ({filter_type}): {len(parameters)} parameters")
+        Args:
+            allergen_names: Allergen names (from get_user_allergens)
+            exclude_unsafe: If True, exclude products with the allergens;
+                            if False, keep only those products
+            product_id_column: Product ID column as referenced in the caller's
+                               query (e.g. "p.id" when products is aliased)
+            
+        Returns:
+            Tuple of (where_clause_snippet, parameters_list)
+        """
+        if not allergen_names:
+            self.logger.debug("No allergens provided, returning empty filter")
+            return "", []
         
-        return where_clause, parameters
+        operator = "NOT IN" if exclude_unsafe else "IN"
+        where_clause = (f"{product_id_column} {operator} "
+                        f"(SELECT product_id FROM unsafe_products WHERE allergen = ANY (%s))")
+        
+        if exclude_unsafe:
+            # Same qualifier as the id column, e.g. "p.ingredients_text" for "p.id"
+            qualifier = product_id_column.rpartition(".")[0]
+            ingredients_column = f"{qualifier}.ingredients_text" if qualifier else "ingredients_text"
+            where_clause = f"{ingredients_column} IS NOT NULL AND {where_clause}"
+        
+        return where_clause, [list(allergen_names)]
     
-    def get_allergen_summary(self, allergen_search_terms: Dict[str, List[str]]) -> Dict:
+    def get_allergen_summary(self, allergen_search_terms: Dict[str, List[str]]) -> Mapping:
         """
         Get a summary of allergen filtering configuration.
         
@@ -161,16 +502,11 @@ class AllergenFilter:
             allergen_search_terms: Dictionary mapping allergen -> search terms
             
         Returns:
-            Dictionary with allergen filtering summary information
+            Read-only mapping with allergen filtering summary information
         """
-        total_terms = sum(len(terms) for terms in allergen_search_terms.values())
-        
-        return {
-            'allergen_count': len(allergen_search_terms),
-            'allergens': list(allergen_search_terms.keys()),
-            'total_search_terms': total_terms,
-            'search_terms_by_allergen': allergen_search_terms
-        }
+        return _allergen_summary(tuple(
+            (allergen, tuple(terms)) for allergen, terms in allergen_search_terms.items()
+        ))
     
     def detect_allergens_in_text(
         self, 
@@ -182,27 +518,141 @@ class AllergenFilter:
         
         This is a utility function that can be used by other modules
         to analyze product ingredients after they've been retrieved.
+        For many texts, use detect_allergens_batch() or get_detector().
         
         Args:
             ingredients_text: The ingredients text to analyze
-            allergen_search_terms: Dictionary mapping allergen -> search terms
+            allergen_search_terms: Dictionary mapping allergen -> lowercase search terms
             
         Returns:
             List of allergen names detected in the text
         """
-        detected = []
-        if not ingredients_text:
-            return detected
+        return self.get_detector(allergen_search_terms)(ingredients_text)
+    
+    def get_detector(self, allergen_search_terms: Dict[str, List[str]]) -> Callable[[Optional[str]], List[str]]:
+        """
+        Resolve the allergen detector for one allergen configuration.
+        
+        Uses the Aho-Corasick automaton when available, else the compiled
+        detector, else the plain loop. Building the configuration key and
+        looking either up costs about as much as checking one text, so
+        callers analysing many texts should call this once and reuse the
+        returned function.
+        
+        Args:
+            allergen_search_terms: Dictionary mapping allergen -> lowercase search terms
+            
+        Returns:
+            Function mapping an ingredients text (None/empty allowed) to the
+            allergen names detected in it
+        """
+        automaton = self._get_automaton(allergen_search_terms)
+        if automaton is not None:
+            allergens = tuple(allergen_search_terms)
+            
+            def detect_with_automaton(ingredients_text: Optional[str]) -> List[str]:
+                if not ingredients_text:
+                    return []
+                return self._detect_with_automaton(automaton, ingredients_text, allergens)
             
-        ingredients_lower = ingredients_text.lower()
+            return detect_with_automaton
         
-        for allergen, terms in allergen_search_terms.items():
-            for term in terms:
-                if term.lower() in ingredients_lower:
-                    detected.append(allergen)
-                    break  # Found this allergen, move to next
+        allergen_terms = tuple(
+            (allergen, tuple(terms)) for allergen, terms in allergen_search_terms.items()
+        )
+        detector = _compile_detector(allergen_terms)
+        
+        if detector is None:
+            def detector(ingredients_lower: str) -> List[str]:
+                detected = []
+                for allergen, terms in allergen_terms:
+                    for term in terms:
+                        if term in ingredients_lower:
+                            detected.append(allergen)
+                            break  # Found this allergen, move to next
+                return detected
+        
+        def detect(ingredients_text: Optional[str]) -> List[str]:
+            if not ingredients_text:
+                return []
+            return detector(ingredients_text.lower())
+        
+        return detect
+    
+    def detect_allergens_batch(
+        self,
+        ingredients_texts: List[str],
+        allergen_search_terms: Dict[str, List[str]]
+    ) -> List[List[str]]:
+        """
+        Detect allergens in many ingredient texts at once.
         
-        return detected
+        Same result as calling detect_allergens_in_text() per text, but the
+        detector (see get_detector()) is resolved once for the whole batch
+        instead of once per text.
+        
+        Args:
+            ingredients_texts: Ingredient texts to analyze (None/empty allowed)
+            allergen_search_terms: Dictionary mapping allergen -> search terms
+            
+        Returns:
+            List of detected allergen lists, one per input text
+        """
+        detector = self.get_detector(allergen_search_terms)
+        return [detector(text) for text in ingredients_texts]
+    
+    @classmethod
+    def _get_automaton(cls, allergen_search_terms: Dict[str, List[str]]):
+        """
+        Get the Aho-Corasick automaton for a set of search terms, building it once.
+        
+        With pyahocorasick installed and at least AHOCORASICK_MIN_TERMS terms,
+        all terms are compiled into one automaton so each text is scanned
+        once instead of once per term.
+        
+        Args:
+            allergen_search_terms: Dictionary mapping allergen -> search terms
+            
+        Returns:
+            The automaton, or None to use plain substring checks
+        """
+        if ahocorasick is None:
+            return None
+        
+        pairs = frozenset(
+            (term, allergen)
+            for allergen, terms in allergen_search_terms.items()
+            for term in terms
+        )
+        if len(pairs) < AHOCORASICK_MIN_TERMS:
+            return None
+        
+        automaton = cls._automaton_cache.get(pairs)
+        if automaton is None:
+            # A term can belong to several allergens (e.g. "aha")
+            allergens_by_term = {}
+            for term, allergen in pairs:
+                allergens_by_term.setdefault(term, set()).add(allergen)
+            
+            automaton = ahocorasick.Automaton()
+            for term, allergens in allergens_by_term.items():
+                automaton.add_word(term, allergens)
+            automaton.make_automaton()
+            
+            with cls._cache_lock:
+                if pairs not in cls._automaton_cache and len(cls._automaton_cache) >= AUTOMATON_CACHE_SIZE:
+                    cls._automaton_cache.pop(next(iter(cls._automaton_cache)))  # Evict the oldest entry
+                cls._automaton_cache[pairs] = automaton
+        
+        return automaton
+    
+    @staticmethod
+    def _detect_with_automaton(automaton, ingredients_text: str, allergens: Tuple[str, ...]) -> List[str]:
+        """Scan one text with the automaton, returning allergens in detect_allergens_in_text() order"""
+        found = set()
+        for _, matched in automaton.iter(ingredients_text.lower()):
+            found.update(matched)
+        return [allergen for allergen in allergens if allergen in found]
     
 class AllergenFilterTester:
     """
@@ -296,7 +746,7 @@ class AllergenFilterTester:
         similarity_query = f"""
         SELECT 
             id, name, key_benefits, description, price,
-            1 - (embedding <=> %s::vector) AS similarity
+            1 - (embedding <=> %s::halfvec) AS similarity
         FROM products 
         WHERE {where_clause}
           AND stock_status = 0
@@ -319,14 +769,22 @@ class AllergenFilterTester:
         try:
             with get_database_manager().get_db_connection() as conn:
                 with conn.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION READ ONLY")
+                
+                # Server-side cursor: rows stream in chunks instead of all at once
+                with conn.cursor(name="allergen_test") as cursor:
+                    cursor.itersize = TEST_QUERY_FETCH_SIZE
                     cursor.execute(query, parameters)
-                    results = cursor.fetchall()
+                    first = next(cursor, None)
+                    count = (first is not None) + sum(1 for _ in cursor)
                     
                     print(f"✅ Query executed successfully")
-                    print(f"   Found {len(results)} products")
+                    print(f"   Found {count} products")
                     
-                    if results:
-                        print(f"   Sample result: {results[0][1]} (ID: {results[0][0]})")
+                    if first:
+                        print(f"   Sample result: {first[1]} (ID: {first[0]})")
+                
+                conn.rollback()  # End the read-only transaction
         
         except Exception as e:
             print(f"❌ Query execution failed: {e}")
@@ -360,7 +818,12 @@ class AllergenFilterTester:
 def parse_args():
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(description="Generate SQL components for allergen-based product filtering")
-    parser.add_argument("--user_id", type=int, required=True, help="User ID to fetch preferences for")
+    users = parser.add_mutually_exclusive_group(required=True)
+    users.add_argument("--user_id", type=int, help="User ID to fetch preferences for")
+    users.add_argument("--user_ids", type=lambda value: [int(user_id) for user_id in value.split(",")],
+                       help="Comma-separated user IDs (e.g. 1,2,3); preferences are fetched in one batch")
+    users.add_argument("--refresh_unsafe_products", action="store_true",
+                       help="Recompute the precomputed unsafe_products view and exit")
     parser.add_argument("--dry_run", action="store_true", default=True, help="Show SQL components without executing queries")
     parser.add_argument("--execute_test", action="store_true", help="Execute test queries to verify SQL validity")
     parser.add_argument("--exclude_unsafe", action="store_true", default=True, help="Generate filter to exclude unsafe products (default)")
@@ -373,6 +836,10 @@ def parse_args():
 def main():
     """Main function - demonstrates AllergenFilter usage"""
     args = parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING, format="%(message)s")
+    
+    if args.refresh_unsafe_products:
+        return refresh_unsafe_products()
     
     print(f"🧪 SmartBeauty Allergen Filter SQL Generator")
     print(f"{'='*60}")
@@ -383,18 +850,25 @@ def main():
     # Determine filter mode
     exclude_unsafe = not args.include_unsafe_only
     
-    if args.test_ingredients:
-        # Test allergen detection in provided ingredients
-        print(f"\n🔬 Testing ingredient analysis:")
-        tester.test_allergen_detection(args.test_ingredients, args.user_id)
+    user_ids = args.user_ids or [args.user_id]
+    if len(user_ids) > 1:
+        # One batched fetch; the per-user steps below are then served from the cache
+        tester.allergen_filter.get_user_allergens_bulk(user_ids)
     
-    # Generate and test SQL components
-    print(f"\n🧪 Generating SQL components:")
-    where_clause, parameters = tester.test_sql_generation(
-        user_id=args.user_id,
-        dry_run=not args.execute_test,
-        exclude_unsafe=exclude_unsafe
-    )
+    components = {}
+    for user_id in user_ids:
+        if args.test_ingredients:
+            # Test allergen detection in provided ingredients
+            print(f"\n🔬 Testing ingredient analysis:")
+            tester.test_allergen_detection(args.test_ingredients, user_id)
+        
+        # Generate and test SQL components
+        print(f"\n🧪 Generating SQL components:")
+        components[user_id] = tester.test_sql_generation(
+            user_id=user_id,
+            dry_run=not args.execute_test,
+            exclude_unsafe=exclude_unsafe
+        )
     
     # Show usage instructions
     print(f"\n💡 Integration Instructions for AnalysisModule:")
@@ -407,10 +881,11 @@ def main():
     print(f"6. Build your query: 'SELECT ... FROM products WHERE ' + where_clause + ' AND your_conditions'")
     print(f"7. Execute with combined parameters: cursor.execute(query, params + your_params)")
     
-    if where_clause:
-        print(f"\n📋 Generated Components for User {args.user_id}:")
-        print(f"   WHERE clause: {where_clause}")
-        print(f"   Parameters: {parameters}")
+    for user_id, (where_clause, parameters) in components.items():
+        if where_clause:
+            print(f"\n📋 Generated Components for User {user_id}:")
+            print(f"   WHERE clause: {where_clause}")
+            print(f"   Parameters: {parameters}")
     
     print(f"\n✅ AllergenFilter ready for integration!")
 
@@ -8,15 +8,114 @@ AllergenFilter components in a larger analysis system.
 
 import sys
 import os
-from typing import List, Dict, Optional
+import weakref
+import logging
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Sequence, Union
+import numpy as np
+from psycopg2 import sql
+from psycopg2.extras import execute_values
 
 # Add parent directory to path
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, parent_dir)
 
-from filtering_products.allergen_filtering import AllergenFilter
+from filtering_products.allergen.allergen_filtering import AllergenFilter
 from db.connection import get_database_manager
 
+# The analysis query has four shapes: with or without similarity ranking, and
+# with or without out-of-stock products. Each is prepared once per connection
+# with the same parameters (similarity vector, allergen pattern, max price,
+# limit, optional columns), so repeated analyses skip parsing and planning. The
+# allergen filter is AllergenFilter's single regex alternation, so any number
+# of search terms fits the same statement; a NULL pattern keeps every product.
+# The heavy text columns are only read and sent when named in $5, so callers
+# that don't need them get NULLs instead of kilobytes per row.
+ANALYSIS_QUERY_TEMPLATE = """
+PREPARE {name} (halfvec, text, numeric, int, text[]) AS
+SELECT 
+    id, name, key_benefits,
+    CASE WHEN 'description' = ANY ($5) THEN description END,
+    CASE WHEN 'active_content' = ANY ($5) THEN active_content END,
+    CASE WHEN 'ingredients_text' = ANY ($5) THEN ingredients_text END,
+    price, stock_status, country,
+    {similarity} AS similarity_score
+FROM products 
+WHERE {conditions}
+{order_by}
+LIMIT $4
+"""
+
+# Product columns returned only when the caller asks for them
+ANALYSIS_OPTIONAL_COLUMNS = ('description', 'active_content', 'ingredients_text')
+
+# Filtered ANN search needs a wider HNSW candidate list than the result limit
+# so enough neighbours survive the price/stock/allergen filters
+ANALYSIS_MIN_EF_SEARCH = 40
+
+def _analysis_statement_name(has_similarity: bool, include_out_of_stock: bool) -> str:
+    """Name of the prepared analysis statement for one query shape"""
+    return (f"analysis_{'similarity' if has_similarity else 'price'}"
+            f"_{'all' if include_out_of_stock else 'in_stock'}")
+
+PREPARE_ANALYSIS_QUERIES = [
+    ANALYSIS_QUERY_TEMPLATE.format(
+        name=_analysis_statement_name(has_similarity, include_out_of_stock),
+        similarity="1 - (embedding <=> $1)" if has_similarity else "0.0",
+        # Cheap column checks first (matching idx_products_stock_price_embedded), allergen scan last
+        conditions="\n  AND ".join(
+            (["embedding IS NOT NULL"] if has_similarity else [])
+            + ([] if include_out_of_stock else ["stock_status = 0"])
+            + ["price <= $3", "($2 IS NULL OR ingredients_text !~* $2)"]
+        ),
+        # Ordering by the distance itself lets the HNSW index serve the query
+        order_by="ORDER BY embedding <=> $1" if has_similarity else "ORDER BY price ASC"
+    )
+    for has_similarity in (True, False)
+    for include_out_of_stock in (True, False)
+]
+
+# Batch analysis for many users in one statement: each user's profile
+# embedding drives its own top-k HNSW search through a LATERAL join, with that
+# user's allergen pattern supplied alongside the user ID in a VALUES list
+BATCH_ANALYSIS_QUERY = """
+SELECT q.user_id, p.*
+FROM (VALUES %s) AS q(user_id, allergen_pattern)
+JOIN users u ON u.id = q.user_id AND u.embedding IS NOT NULL
+CROSS JOIN LATERAL (
+    SELECT 
+        id, name, key_benefits, description, active_content,
+        ingredients_text, price, stock_status, country,
+        1 - (embedding <=> u.embedding) AS similarity_score
+    FROM products 
+    WHERE {conditions}
+    ORDER BY embedding <=> u.embedding
+    LIMIT {limit}
+) p
+ORDER BY q.user_id, p.similarity_score DESC
+"""
+
+# Pooled connections that already have the analysis statements prepared
+_prepared_connections = weakref.WeakSet()
+
+def prepare_analysis_connection(conn):
+    """
+    Prepare the analysis statements on a connection, once per connection.
+    
+    The similarity vector is bound as a numpy array through the pgvector
+    adapters the pool registers, instead of a Python-formatted string.
+    
+    Args:
+        conn: PostgreSQL connection object
+    """
+    if conn not in _prepared_connections:
+        with conn.cursor() as cursor:
+            for prepare_sql in PREPARE_ANALYSIS_QUERIES:
+                cursor.execute(prepare_sql)
+        _prepared_connections.add(conn)
+
 
 class AnalysisModuleExample:
     """
@@ -26,14 +125,17 @@ class AnalysisModuleExample:
     
     def __init__(self):
         self.allergen_filter = AllergenFilter()
+        self.logger = logging.getLogger(__name__)
+        self._executor = None
     
     def analyze_products_for_user(
         self, 
         user_id: int,
         max_price: float = 100.0,
         include_out_of_stock: bool = False,
-        similarity_vector: Optional[List[float]] = None,
-        limit: int = 20
+        similarity_vector: Optional[Union[List[float], np.ndarray]] = None,
+        limit: int = 20,
+        columns: Optional[List[str]] = None
     ) -> List[Dict]:
         """
         Complete product analysis with allergen filtering, price filtering,
@@ -45,18 +147,29 @@ class AnalysisModuleExample:
             include_out_of_stock: Whether to include out-of-stock products
             similarity_vector: Optional embedding vector for similarity search
             limit: Maximum number of results
+            columns: Optional columns to include in each product (any of
+                ANALYSIS_OPTIONAL_COLUMNS); none by default
             
         Returns:
             List of analyzed products with safety and ranking information
         """
-        print(f"🔍 Analyzing products for user {user_id}")
-        print(f"   Price limit: ${max_price}")
-        print(f"   Include out of stock: {include_out_of_stock}")
-        print(f"   Similarity search: {'Yes' if similarity_vector else 'No'}")
-        print(f"   Result limit: {limit}")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(
+                "Analyzing products for user %s (price limit %s, include out of stock %s, "
+                "similarity search %s, limit %s)",
+                user_id, max_price, include_out_of_stock, similarity_vector is not None, limit
+            )
         
-        # Step 1: Get allergen filter components
-        allergen_where, allergen_params = self._get_allergen_filter(user_id)
+        # Step 1: Get allergen filter components; the preferences are fetched
+        # once here and reused by post-processing
+        allergen_names, search_terms = self._get_user_allergen_terms(user_id)
+        allergen_where, allergen_params = self._get_allergen_filter(allergen_names, search_terms)
+        
+        requested_columns = [column for column in ANALYSIS_OPTIONAL_COLUMNS if column in (columns or ())]
+        fetched_columns = list(requested_columns)
+        if search_terms and not allergen_where and 'ingredients_text' not in fetched_columns:
+            # Post-processing scans the ingredients when the query did not screen them
+            fetched_columns.append('ingredients_text')
         
         # Step 2: Build comprehensive query
         query, params = self._build_analysis_query(
@@ -65,38 +178,149 @@ class AnalysisModuleExample:
             max_price=max_price,
             include_out_of_stock=include_out_of_stock,
             similarity_vector=similarity_vector,
-            limit=limit
+            limit=limit,
+            columns=fetched_columns
         )
         
         # Step 3: Execute query
-        products = self._execute_analysis_query(query, params)
+        has_similarity = similarity_vector is not None and len(similarity_vector) > 0
+        ef_search = max(ANALYSIS_MIN_EF_SEARCH, limit) if has_similarity else None
+        products = self._execute_analysis_query(query, params, ef_search)
         
         # Step 4: Post-process results
-        analyzed_products = self._post_process_results(products, user_id)
+        analyzed_products = self._post_process_results(
+            products, allergen_names, search_terms, allergen_screened=bool(allergen_where),
+            columns=requested_columns
+        )
         
-        print(f"✅ Analysis complete: {len(analyzed_products)} products found")
+        self.logger.debug("Analysis complete: %s products found", len(analyzed_products))
         return analyzed_products
     
-    def _get_allergen_filter(self, user_id: int) -> tuple:
-        """Get allergen filter SQL components"""
-        print(f"  📡 Getting allergen preferences...")
+    async def analyze_products_for_user_async(self, user_id: int, **kwargs) -> List[Dict]:
+        """
+        Run analyze_products_for_user without blocking the event loop.
+        
+        Analyses run on a thread pool no larger than the database connection
+        pool, so concurrent users' database waits overlap, e.g.:
+        
+            results = await asyncio.gather(
+                *(module.analyze_products_for_user_async(uid) for uid in user_ids))
+        
+        Args:
+            user_id: User ID for allergen preferences
+            **kwargs: Any other analyze_products_for_user arguments
+            
+        Returns:
+            List of analyzed products with safety and ranking information
+        """
+        if self._executor is None:
+            # ThreadedConnectionPool fails instead of waiting when exhausted,
+            # so never run more analyses at once than it has connections
+            self._executor = ThreadPoolExecutor(max_workers=get_database_manager().max_conn)
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(self.analyze_products_for_user, user_id, **kwargs)
+        )
+    
+    def analyze_products_for_users(
+        self,
+        user_ids: List[int],
+        max_price: float = 100.0,
+        include_out_of_stock: bool = False,
+        limit: int = 20
+    ) -> Dict[int, List[Dict]]:
+        """
+        Analyze products for many users in a single query, ranking each
+        user's results by similarity to their profile embedding.
+        
+        Args:
+            user_ids: User IDs to analyze
+            max_price: Maximum product price
+            include_out_of_stock: Whether to include out-of-stock products
+            limit: Maximum number of results per user
+            
+        Returns:
+            Dictionary mapping each user ID to its analyzed products (empty
+            for users without a profile embedding)
+        """
+        self.logger.debug("Analyzing products for %s users", len(user_ids))
+        
+        user_terms = {user_id: self._get_user_allergen_terms(user_id) for user_id in user_ids}
+        results = {user_id: [] for user_id in user_ids}
+        if not user_terms:
+            return results
+        
+        values = []
+        screened_users = set()
+        for user_id, (allergen_names, search_terms) in user_terms.items():
+            allergen_where, allergen_params = self._get_allergen_filter(allergen_names, search_terms)
+            values.append((user_id, allergen_params[0] if allergen_where else None))
+            if allergen_where:
+                screened_users.add(user_id)
+        
+        conditions = [sql.SQL("embedding IS NOT NULL")]
+        if not include_out_of_stock:
+            conditions.append(sql.SQL("stock_status = 0"))
+        conditions.append(sql.SQL("price <= {}").format(sql.Literal(max_price)))
+        conditions.append(sql.SQL("(q.allergen_pattern IS NULL OR ingredients_text !~* q.allergen_pattern)"))
+        query = sql.SQL(BATCH_ANALYSIS_QUERY).format(
+            conditions=sql.SQL("\n      AND ").join(conditions), limit=sql.Literal(limit)
+        )
+        
+        try:
+            with get_database_manager().get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SET LOCAL hnsw.ef_search = %s", (max(ANALYSIS_MIN_EF_SEARCH, limit),))
+                    # One page, so every user is answered in a single round trip
+                    rows = execute_values(
+                        cursor, query, values, template="(%s, %s::text)",
+                        page_size=len(values), fetch=True
+                    )
+        except Exception as e:
+            self.logger.error("Batch analysis query failed: %s", e)
+            return results
+        
+        products_by_user = {}
+        for row in rows:
+            products_by_user.setdefault(row[0], []).append(row[1:])
+        
+        for user_id, products in products_by_user.items():
+            allergen_names, search_terms = user_terms[user_id]
+            results[user_id] = self._post_process_results(
+                products, allergen_names, search_terms, allergen_screened=user_id in screened_users
+            )
+        
+        self.logger.debug("Batch analysis complete: %s rows for %s users", len(rows), len(products_by_user))
+        return results
+    
+    def _get_user_allergen_terms(self, user_id: int) -> tuple:
+        """Get the user's allergen names and their search terms"""
+        self.logger.debug("Getting allergen preferences for user %s", user_id)
         
         # Get user allergens
         allergen_names, preferences = self.allergen_filter.get_user_allergens(user_id)
         
         if not allergen_names:
-            print(f"  ✅ No allergen restrictions")
-            return "", []
+            return [], {}
         
         # Generate search terms
         search_terms = self.allergen_filter.generate_search_terms(allergen_names)
+        return allergen_names, search_terms
+    
+    def _get_allergen_filter(self, allergen_names: List[str], search_terms: Dict[str, List[str]]) -> tuple:
+        """Get allergen filter SQL components"""
+        if not allergen_names:
+            self.logger.debug("No allergen restrictions")
+            return "", []
         
         # Get SQL components
         where_clause, params = self.allergen_filter.generate_allergen_filter_sql(
             search_terms, exclude_unsafe=True
         )
         
-        print(f"  🛡️  Allergen filter active: {len(allergen_names)} allergens, {len(params)} search terms")
+        self.logger.debug("Allergen filter active: %s allergens, %s search terms",
+                          len(allergen_names), sum(len(terms) for terms in search_terms.values()))
         return where_clause, params
     
     def _build_analysis_query(
@@ -105,117 +329,85 @@ class AnalysisModuleExample:
         allergen_params: List[str],
         max_price: float,
         include_out_of_stock: bool,
-        similarity_vector: Optional[List[float]],
-        limit: int
+        similarity_vector: Optional[Union[List[float], np.ndarray]],
+        limit: int,
+        columns: List[str]
     ) -> tuple:
-        """Build the comprehensive analysis SQL query"""
-        print(f"  🏗️  Building analysis query...")
-        
-        # Base SELECT with conditional similarity
-        if similarity_vector:
-            select_clause = """
-            SELECT 
-                id, name, key_benefits, description, active_content,
-                ingredients_text, price, stock_status, country,
-                1 - (embedding <=> %s::vector) AS similarity_score
-            """
-            similarity_param = [str(similarity_vector)]
-            order_by = "ORDER BY similarity_score DESC"
-        else:
-            select_clause = """
-            SELECT 
-                id, name, key_benefits, description, active_content,
-                ingredients_text, price, stock_status, country,
-                0.0 AS similarity_score
-            """
-            similarity_param = []
-            order_by = "ORDER BY price ASC"
-        
-        # Build WHERE conditions
-        where_conditions = []
-        params = similarity_param.copy()
-        
-        # Add allergen filter if present
-        if allergen_where:
-            where_conditions.append(f"({allergen_where})")
-            params.extend(allergen_params)
-        
-        # Add price filter
-        where_conditions.append("price <= %s")
-        params.append(str(max_price))
-        
-        # Add stock filter if needed
-        if not include_out_of_stock:
-            where_conditions.append("stock_status = 0")
-        
-        # Add embedding filter for similarity search
-        if similarity_vector:
-            where_conditions.append("embedding IS NOT NULL")
-        
-        # Combine query parts
-        where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
-        
-        query = f"""
-        {select_clause}
-        FROM products 
-        {where_clause}
-        {order_by}
-        LIMIT %s
-        """
+        """Pick the prepared analysis statement for this request and bind its parameters"""
+        has_similarity = similarity_vector is not None and len(similarity_vector) > 0
+        statement_name = _analysis_statement_name(has_similarity, include_out_of_stock)
+        query = f"EXECUTE {statement_name} (%s::halfvec, %s::text, %s, %s, %s::text[])"
         
-        params.append(str(limit))
+        # allergen_params holds the one regex behind allergen_where
+        params = [
+            np.asarray(similarity_vector, dtype=np.float32) if has_similarity else None,
+            allergen_params[0] if allergen_where else None,
+            max_price,
+            limit,
+            list(columns)
+        ]
         
-        print(f"  📝 Query built: {len(where_conditions)} conditions, {len(params)} parameters")
+        self.logger.debug("Query built: %s, allergen filter %s", statement_name, params[1] is not None)
         return query, params
     
-    def _execute_analysis_query(self, query: str, params: List[str]) -> List[tuple]:
-        """Execute the analysis query"""
-        print(f"  ⚡ Executing analysis query...")
-        
+    def _execute_analysis_query(self, query: str, params: List, ef_search: Optional[int] = None) -> List[tuple]:
+        """Execute the analysis query, widening the HNSW search for similarity queries"""
         try:
             with get_database_manager().get_db_connection() as conn:
+                prepare_analysis_connection(conn)
                 with conn.cursor() as cursor:
+                    if ef_search:
+                        # Scoped to this transaction; the pool rolls it back on return
+                        cursor.execute("SET LOCAL hnsw.ef_search = %s", (ef_search,))
                     cursor.execute(query, params)
                     results = cursor.fetchall()
                     
-                    print(f"  ✅ Query successful: {len(results)} products retrieved")
+                    self.logger.debug("Query successful: %s products retrieved", len(results))
                     return results
         
         except Exception as e:
-            print(f"  ❌ Query failed: {e}")
+            self.logger.error("Analysis query failed: %s", e)
             return []
     
-    def _post_process_results(self, products: List[tuple], user_id: int) -> List[Dict]:
-        """Post-process results with additional analysis"""
-        print(f"  🔄 Post-processing {len(products)} products...")
+    def _post_process_results(
+        self,
+        products: List[tuple],
+        allergen_names: List[str],
+        search_terms: Dict[str, List[str]],
+        allergen_screened: bool,
+        columns: Sequence[str] = ANALYSIS_OPTIONAL_COLUMNS
+    ) -> List[Dict]:
+        """
+        Post-process results with additional analysis.
         
-        # Get allergen info for detailed analysis
-        allergen_names, _ = self.allergen_filter.get_user_allergens(user_id)
-        search_terms = {}
-        if allergen_names:
-            search_terms = self.allergen_filter.generate_search_terms(allergen_names)
+        When the query already excluded every product matching a search term
+        (allergen_screened), the same case-insensitive substring check cannot
+        find anything in the returned rows, so it is skipped.
+        
+        Only the optional columns listed in columns are copied into the
+        analyzed products.
+        """
+        self.logger.debug("Post-processing %s products", len(products))
         
         analyzed_products = []
         
-        for product in products:
+        # Analyze allergen safety in detail, all products in one batch
+        if search_terms and not allergen_screened:
+            detections = self.allergen_filter.detect_allergens_batch(
+                [product[5] for product in products], search_terms
+            )
+        else:
+            detections = [[] for _ in products]
+        
+        for product, detected_allergens in zip(products, detections):
             (product_id, name, benefits, description, active_content, 
              ingredients, price, stock_status, country, similarity) = product
             
-            # Analyze allergen safety in detail
-            detected_allergens = []
-            if search_terms and ingredients:
-                detected_allergens = self.allergen_filter.detect_allergens_in_text(
-                    ingredients, search_terms
-                )
-            
             # Create comprehensive product analysis
             analyzed_product = {
                 'id': product_id,
                 'name': name,
                 'key_benefits': benefits,
-                'description': description,
-                'active_content': active_content,
-                'ingredients_text': ingredients,
                 'price': float(price) if price else 0.0,
                 'stock_status': stock_status,
                 'country': country,
@@ -231,6 +423,14 @@ class AnalysisModuleExample:
                 }
             }
             
+            optional_values = {
+                'description': description,
+                'active_content': active_content,
+                'ingredients_text': ingredients
+            }
+            for column in columns:
+                analyzed_product[column] = optional_values[column]
+            
             analyzed_products.append(analyzed_product)
         
         return analyzed_products
@@ -278,4 +478,5 @@ def test_integration_example():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format="  %(message)s")
     test_integration_example()
@@ -35,6 +35,8 @@ sys.path.insert(0, parent_dir)
 from create_user_document import create_user_profile_document
 from utility.get_preference import get_preference
 from db.connection import get_database_manager
+from psycopg2.extras import execute_values
+import numpy as np
 
 
 class UserProfilePopulator:
@@ -93,31 +95,32 @@ class UserProfilePopulator:
             
             print(f"Processing {len(users_without_embeddings)} users without embeddings...")
             
-            # Process each user
+            # Embed every pending profile in one batch
+            user_ids = [user_id for user_id, _ in users_without_embeddings]
+            embeddings = embedding_model.embed_documents(
+                [embedding_text for _, embedding_text in users_without_embeddings]
+            )
+            
+            # Write all embeddings in a single statement and transaction
+            # instead of one connection, round-trip and commit per user
             successful = 0
-            for user_id, embedding_text in users_without_embeddings:
-                try:
-                    print(f"Processing user {user_id}...")
-                    
-                    # Generate embedding
-                    embedding = embedding_model.embed_query(embedding_text)
-                    embedding_str = str(embedding)
-                    
-                    # Update user with embedding
-                    with get_database_manager().get_db_connection() as conn:
-                        with conn.cursor() as cursor:
-                            cursor.execute("""
-                                UPDATE users
-                                SET embedding = %s::vector
-                                WHERE id = %s
-                            """, (embedding_str, user_id))
-                            conn.commit()
-                    
-                    successful += 1
-                    print(f"Updated embedding for user {user_id}")
-                    
-                except Exception as e:
-                    print(f"Error processing user {user_id}: {e}")
+            try:
+                with get_database_manager().get_db_connection() as conn:
+                    with conn.cursor() as cursor:
+                        execute_values(cursor, """
+                            UPDATE users
+                            SET embedding = data.embedding::halfvec
+                            FROM (VALUES %s) AS data (id, embedding)
+                            WHERE users.id = data.id
+                        """, [(user_id, np.asarray(embedding, dtype=np.float32))
+                              for user_id, embedding in zip(user_ids, embeddings)],
+                            page_size=len(user_ids))
+                        conn.commit()
+                successful = len(user_ids)
+                print(f"Updated embeddings for users: {', '.join(map(str, user_ids))}")
+                
+            except Exception as e:
+                print(f"Error updating user embeddings: {e}")
             
             print(f"Successfully generated embeddings for {successful}/{len(users_without_embeddings)} users")
             return successful > 0
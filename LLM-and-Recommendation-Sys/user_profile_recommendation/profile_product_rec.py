@@ -18,6 +18,7 @@ import argparse
 import json
 from typing import List, Dict, Optional
 from datetime import datetime
+import numpy as np
 
 # Add parent directory to path for imports
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -25,6 +26,7 @@ sys.path.insert(0, parent_dir)
 
 from filtering_products.allergen.allergen_filtering import AllergenFilter
 from db.connection import get_database_manager
+from db.utils import to_vector_array, format_vector_literal
 
 
 class ProfileProductRecommendation:
@@ -70,7 +72,7 @@ class ProfileProductRecommendation:
         print(f"\nStep 1: Retrieving user profile embedding...")
         user_embedding = self._get_user_embedding(user_id)
         
-        if not user_embedding:
+        if user_embedding is None:
             return {
                 'user_id': user_id,
                 'user_profile': {'message': 'User profile embedding not found'},
@@ -106,7 +108,7 @@ class ProfileProductRecommendation:
             }
         }
     
-    def _get_user_embedding(self, user_id: int) -> Optional[List[float]]:
+    def _get_user_embedding(self, user_id: int) -> Optional[np.ndarray]:
         """Get user profile embedding from the database"""
         print(f"  Fetching user embedding for user {user_id}...")
         
@@ -127,11 +129,10 @@ class ProfileProductRecommendation:
                     
                     embedding, embedding_text = result
                     
-                    if embedding:
-                        # Convert PostgreSQL vector to Python list
-                        embedding_str = str(embedding)
-                        if embedding_str.startswith('[') and embedding_str.endswith(']'):
-                            embedding_list = [float(x.strip()) for x in embedding_str[1:-1].split(',')]
+                    if embedding is not None:
+                        # Convert PostgreSQL vector to a float32 array
+                        embedding_list = to_vector_array(embedding)
+                        if embedding_list is not None:
                             print(f"    Successfully retrieved user embedding ({len(embedding_list)}D)")
                             print(f"    User profile: {embedding_text[:100]}..." if embedding_text else "    No profile text")
                             return embedding_list
@@ -210,7 +211,7 @@ class ProfileProductRecommendation:
     
     def _calculate_product_similarities(
         self,
-        user_embedding: List[float],
+        user_embedding: np.ndarray,
         allergen_where: str,
         allergen_params: List[str],
         top_n: int,
@@ -220,7 +221,7 @@ class ProfileProductRecommendation:
         """Calculate product similarities using a single SQL query"""
         print(f"  Calculating product similarities using single query...")
         
-        if not user_embedding:
+        if user_embedding is None:
             print("    No user embedding available, cannot calculate similarities.")
             return []
         
@@ -247,7 +248,7 @@ class ProfileProductRecommendation:
             query = f"""
             SELECT
                 id, name, key_benefits, description, price, stock_status,
-                (1 - (embedding <=> %s::vector)) AS similarity_score
+                (1 - (embedding <=> %s::halfvec)) AS similarity_score
             FROM products
             {where_clause}
             ORDER BY similarity_score DESC
@@ -255,7 +256,7 @@ class ProfileProductRecommendation:
             """
             
             # Add user embedding as first parameter
-            query_params.insert(0, str(user_embedding))
+            query_params.insert(0, format_vector_literal(user_embedding))
             query_params.append(top_n)
             
             products = []
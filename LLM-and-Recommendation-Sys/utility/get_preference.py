@@ -1,15 +1,43 @@
 import requests
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from requests.adapters import HTTPAdapter
 
 INVENTRA_API_BASE_URL = "https://api.inventra.ca/api"
 
+# Concurrent preference requests made by get_preferences()
+PREFERENCE_FETCH_WORKERS = 8
+
+# One keep-alive session for every preference request, so repeated lookups
+# reuse TCP/TLS connections instead of handshaking each time
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=PREFERENCE_FETCH_WORKERS))
+
 
 def get_preference(user_id: int):
     try:
-        response = requests.get(f"{INVENTRA_API_BASE_URL}/beauty-preferences/{user_id}", timeout=5.0)
+        response = _session.get(f"{INVENTRA_API_BASE_URL}/beauty-preferences/{user_id}", timeout=5.0)
         response.raise_for_status()
         return response.json()
     except requests.RequestException as e:
         print(f"Failed to fetch analysis for user {user_id}: {e}")
-        
\ No newline at end of file
+
+
+def get_preferences(user_ids: List[int]) -> Dict[int, dict]:
+    """
+    Fetch preferences for many users, several requests at a time over the shared session.
+    
+    Args:
+        user_ids: Users to fetch preferences for
+        
+    Returns:
+        Dictionary mapping user_id -> preferences (None if the request failed)
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+    
+    with ThreadPoolExecutor(max_workers=min(PREFERENCE_FETCH_WORKERS, len(user_ids))) as executor:
+        return dict(zip(user_ids, executor.map(get_preference, user_ids)))
@@ -6,7 +6,7 @@ from typing import Dict, Any, Optional, Tuple, List
 from datetime import datetime
 from dotenv import load_dotenv
 import psycopg2
-from psycopg2 import Error
+from psycopg2 import Error, sql
 
 def load_environment() -> Dict[str, Any]:
     """
@@ -175,7 +175,7 @@ def test_db_connection(connection_string: str, table_name: str = None) -> bool:
                 print(f"The table '{table_name}' exists!")
                 
                 # Count rows
-                cursor.execute(f"SELECT COUNT(*) FROM {table_name};")
+                cursor.execute(sql.SQL("SELECT COUNT(*) FROM {};").format(sql.Identifier(table_name)))
                 count = cursor.fetchone()[0]
                 print(f"Table '{table_name}' has {count} rows.")
             else:
@@ -736,7 +736,7 @@ def get_database_stats() -> Dict[str, Any]:
         tables = ['products', 'skin_conditions', 'langchain_pg_embedding', 'langchain_pg_collection']
         for table in tables:
             try:
-                cursor.execute(f"SELECT COUNT(*) FROM {table};")
+                cursor.execute(sql.SQL("SELECT COUNT(*) FROM {};").format(sql.Identifier(table)))
                 stats[f'{table}_count'] = cursor.fetchone()[0]
             except:
                 stats[f'{table}_count'] = 0